@@ -1,137 +1,319 @@
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory, stream_with_context
+import json
+import logging
 import os
+import time
 import uuid
-from threading import Thread
-from pose_format import Pose
-from pose_format.pose_visualizer import PoseVisualizer
+from threading import BoundedSemaphore, Thread
 
+import numpy as np
 import sys
 sys.path.append('.')
-from spoken_to_signed.bin import _text_to_gloss, _gloss_to_pose
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+from spoken_to_signed.bin import _cached_text_to_gloss, _get_pose_lookup, _text_to_gloss, _text_to_gloss_batch, \
+    _gloss_to_pose, _gloss_to_pose_stream
+from spoken_to_signed.gloss_to_pose.lookup.pose_cache import PoseCacheSettings
+from spoken_to_signed.metrics import REGISTRY, STAGE_ERRORS, max_rss_bytes, peak_memory, rss_bytes, span
+from spoken_to_signed.pipeline import for_each, run_pipeline
+from spoken_to_signed.pose_to_video.renderer import RenderSettings, get_draw_pool, render_video, render_video_stream
+from spoken_to_signed.pose_to_video.wire import MEDIA_TYPE, VERSION as POSE_WIRE_VERSION, compress, encode_pose
+from spoken_to_signed.text_to_gloss.cache import GlossCacheSettings, get_gloss_cache
+from spoken_to_signed.text_to_gloss.gemini_client import GeminiSettings, get_gemini_client
+from output_cache import OutputCache, OutputCacheSettings, output_key
+from scheduler import JobScheduler
+from status_store import FINISHED, StatusStore
+
+# Log DEBUG để xem thời gian từng bước (mặc định tắt, không tốn gì trên đường xử lý chính)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING"),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+LEXICON_DIR = "assets/vietnamese_lexicon"
+# "trie" tách câu offline theo từ điển, chỉ gọi GLOSSER_FALLBACK (LLM) khi câu còn từ không có trong từ điển
+GLOSSER = os.environ.get("GLOSSER", "trie")
+GLOSSER_FALLBACK = os.environ.get("GLOSSER_FALLBACK", "gpt")
+# Lưu file .pose của mỗi request vào static/poses (không cần cho việc tạo video)
+SAVE_POSES = os.environ.get("SAVE_POSES", "0") == "1"
+RenderSettings.ffmpeg = os.environ.get("FFMPEG", RenderSettings.ffmpeg)
+# Phát video trong lúc đang render: mỗi ký hiệu được mã hoá ngay khi biết điểm nối với ký hiệu sau
+RenderSettings.streaming = os.environ.get("STREAMING", "0") == "1"
+# Số tiến trình vẽ frame, dùng chung cho mọi task. Mặc định 1 (vẽ trên luồng render) để việc import app (reloader
+# của Flask, các công cụ) không fork cả pool; DRAW_WORKERS > 1 tạo pool ngay khi khởi động, trước khi có thread khác
+RenderSettings.draw_workers = int(os.environ.get("DRAW_WORKERS", 1))
+if RenderSettings.draw_workers > 1:
+    get_draw_pool(RenderSettings.draw_workers)
+
+def warm_up():
+    from scipy.signal import savgol_filter  # noqa: F401
+    from pose_format.pose_visualizer import PoseVisualizer  # noqa: F401
+
+# scipy và OpenCV chỉ được import khi cần (mất khoảng 1 giây), nạp trước trong nền để server lên ngay
+# mà request đầu tiên không phải chờ; tắt bằng WARMUP=0. Sau khi tạo pool vẽ, không fork khi đã có thread khác
+if os.environ.get("WARMUP", "1") == "1":
+    Thread(target=warm_up, name="warmup", daemon=True).start()
 
 app = Flask(__name__)
 
+# Cache pose dùng chung cho mọi request, giới hạn theo số byte
+PoseCacheSettings.max_bytes = int(os.environ.get("POSE_CACHE_MAX_BYTES", PoseCacheSettings.max_bytes))
+# Chỉ lookup CSV có cache để nạp trước; gói compiled đã được map sẵn
+if os.environ.get("POSE_CACHE_PRELOAD", "0") == "1" and hasattr(_get_pose_lookup(LEXICON_DIR), "preload"):
+    _get_pose_lookup(LEXICON_DIR).preload()
+
+# Video đã render: giới hạn dung lượng (byte) và tuổi (giây)
+OutputCacheSettings.max_bytes = int(os.environ.get("OUTPUT_CACHE_MAX_BYTES", OutputCacheSettings.max_bytes))
+OutputCacheSettings.max_age = float(os.environ.get("OUTPUT_CACHE_MAX_AGE", OutputCacheSettings.max_age))
+
+# Cache kết quả text -> gloss trên đĩa (SQLite)
+GlossCacheSettings.path = os.environ.get("GLOSS_CACHE_PATH", GlossCacheSettings.path)
+GlossCacheSettings.ttl = float(os.environ.get("GLOSS_CACHE_TTL", GlossCacheSettings.ttl))
+GlossCacheSettings.max_entries = int(os.environ.get("GLOSS_CACHE_MAX_ENTRIES", GlossCacheSettings.max_entries))
+
+# Gemini (GEMINI_API_KEY, GEMINI_ENDPOINT): số request đồng thời cho mọi worker, thời hạn mỗi lần gọi (giây)
+GeminiSettings.max_concurrency = int(os.environ.get("GEMINI_MAX_CONCURRENCY", GeminiSettings.max_concurrency))
+GeminiSettings.deadline = float(os.environ.get("GEMINI_DEADLINE", GeminiSettings.deadline))
+GeminiSettings.attempt_timeout = float(os.environ.get("GEMINI_TIMEOUT", GeminiSettings.attempt_timeout))
+GeminiSettings.retries = int(os.environ.get("GEMINI_RETRIES", GeminiSettings.retries))
+
+# /convert/batch: số câu tối đa mỗi batch, số câu mỗi lần gọi glosser, số batch chạy cùng lúc
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 400))
+BATCH_GLOSS_SIZE = int(os.environ.get("BATCH_GLOSS_SIZE", 16))
+batch_slots = BoundedSemaphore(int(os.environ.get("BATCH_CONCURRENCY", 1)))
+
 os.makedirs('static/videos', exist_ok=True)
 os.makedirs('static/poses', exist_ok=True)
 
 class VideoProcessor:
     def __init__(self):
-        self.processing_status = {}
+        self.processing_status = StatusStore(
+            finished_ttl=float(os.environ.get("STATUS_TTL", 600)),
+            stale_ttl=float(os.environ.get("STATUS_STALE_TTL", 3600)),
+        )
+        # Video đã render, dùng lại cho mọi câu có cùng chuỗi gloss
+        self.output_cache = OutputCache('static/videos')
+        # task_id -> khoá video đang được stream
+        self.stream_keys = {}
     
-    def text_to_pose_direct(self, text, task_id):
-        """Gọi trực tiếp function thay vì subprocess"""
+    def text_to_gloss(self, text, task_id):
+        """Chuyển text thành gloss"""
         try:
-            self.processing_status[task_id] = {"status": "processing", "step": "Đang chuyển text thành pose..."}
-            
-            
-            sentences = _text_to_gloss(
-                text=text,
-                language="vi",
-                glosser="gpt",
-                signed_language="vsl"
-            )
+            self.processing_status[task_id] = {"status": "processing", "step": "Đang chuyển text thành gloss..."}
+
+            with span("processor.text_to_gloss", task_id=task_id):
+                sentences = _text_to_gloss(
+                    text=text,
+                    language="vi",
+                    glosser=GLOSSER,
+                    signed_language="vsl",
+                    lexicon=LEXICON_DIR,
+                    fallback_glosser=GLOSSER_FALLBACK
+                )
             
             if not sentences:
+                STAGE_ERRORS.inc(stage="processor.text_to_gloss")
                 self.processing_status[task_id] = {"status": "error", "message": "Không tạo được gloss từ text"}
                 return None
+
+            return sentences
+
+        except Exception as e:
+            self.processing_status[task_id] = {"status": "error", "message": f"Lỗi: {str(e)}"}
+            return None
+
+    def gloss_to_pose(self, sentences, task_id):
+        """Tra cứu pose cho gloss, ghi file pose (nếu bật) ở luồng nền"""
+        try:
+            self.processing_status[task_id] = {"status": "processing", "step": "Đang tạo pose từ gloss..."}
             
-            self.processing_status[task_id]["step"] = "Đang tạo pose từ gloss..."
-            
-            pose = _gloss_to_pose(
-                sentences=sentences,
-                lexicon="assets/vietnamese_lexicon",
-                spoken_language="vi",
-                signed_language="vsl"
-            )
+            with span("processor.gloss_to_pose", task_id=task_id):
+                pose = _gloss_to_pose(
+                    sentences=sentences,
+                    lexicon=LEXICON_DIR,
+                    spoken_language="vi",
+                    signed_language="vsl"
+                )
             
             if pose is None:
                 self.processing_status[task_id] = {"status": "error", "message": "Không tạo được pose"}
                 return None
-            
-           
-            pose_file = f"static/poses/{task_id}.pose"
-            with open(pose_file, "wb") as f:
-                pose.write(f)
-                
-            return pose_file
+
+            return pose
             
         except Exception as e:
             self.processing_status[task_id] = {"status": "error", "message": f"Lỗi: {str(e)}"}
             return None
-    
-    def pose_to_video(self, pose_file, task_id):
-        """Chuyển pose thành video H.264"""
-        try:
-            print(f"🔍 Starting pose_to_video: {pose_file}")
-            self.processing_status[task_id]["step"] = "Đang tạo video từ pose..."
-
-            if not os.path.exists(pose_file):
-                print(f"❌ Pose file not found: {pose_file}")
-                self.processing_status[task_id] = {"status": "error", "message": "Pose file không tồn tại"}
-                return None
-
-            with open(pose_file, "rb") as f:
-                pose = Pose.read(f.read())
 
-            v = PoseVisualizer(pose)
+    def save_pose(self, pose, key):
+        pose_file = f"static/poses/{key}.pose"
+        with open(pose_file, "wb") as f:
+            pose.write(f)
 
-            raw_video = f"static/videos/{task_id}_raw.mp4"
-            final_video = f"static/videos/{task_id}.mp4"
+    def gloss(self, task_id, text):
+        """Tầng I/O: text -> gloss, hoàn thành ngay nếu chuỗi gloss đã có video"""
+        sentences = self.text_to_gloss(text, task_id)
+        if not sentences:
+            return None
 
-            
-            v.save_video(raw_video, v.draw())
+        try:
+            video = self.output_cache.get(output_key(sentences, LEXICON_DIR))
+        except Exception as e:
+            # Khoá đọc index.csv và các file index đã build, có thể đang được thay
+            self.processing_status[task_id] = {"status": "error", "message": f"Lỗi: {str(e)}"}
+            return None
+        if video is not None:
+            self.processing_status[task_id] = {"status": "completed", "video": video}
+            return None
+        return sentences
 
-            
-            import subprocess
-            ffmpeg_cmd = [
-                "/usr/bin/ffmpeg", "-y",
-                "-i", raw_video,
-                "-c:v", "libx264",
-                "-pix_fmt", "yuv420p",
-                "-r", "25",
-                final_video
-            ]
-            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-
-            if result.returncode == 0:
-                print("✅ FFmpeg conversion successful")
-                os.remove(raw_video)
-            else:
-                print("❌ FFmpeg error:")
-                print(result.stderr)
-                self.processing_status[task_id] = {"status": "error", "message": "FFmpeg lỗi: " + result.stderr}
-                return None
+    def render(self, task_id, sentences):
+        """Tầng CPU: gloss -> pose -> video, các task cùng chuỗi gloss chờ chung một lần render"""
+        def create(path):
+            pose = self.gloss_to_pose(sentences, task_id)
+            if pose is None:
+                raise RuntimeError(self.processing_status[task_id]["message"])
+            if SAVE_POSES:
+                Thread(target=self.save_pose, args=(pose, key), daemon=True).start()
+            self.processing_status.update(task_id, step="Đang tạo video từ pose...")
+            render_video(pose, path)
 
-            
-            result = subprocess.run(
-                ['/usr/bin/ffprobe', '-v', 'quiet', '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', final_video],
-                capture_output=True, text=True
-            )
-            codec = result.stdout.strip()
-            print(f"✅ Final video codec: {codec}")
+        def create_stream(path):
+            self.processing_status.update(task_id, step="Đang tạo video...")
+            segments = []
+            def keep(stream):
+                for segment in stream:
+                    if SAVE_POSES:
+                        segments.append(segment)
+                    yield segment
 
-            self.processing_status[task_id] = {"status": "completed", "video": final_video}
-            return final_video
+            render_video_stream(keep(_gloss_to_pose_stream(sentences, LEXICON_DIR, "vi", "vsl")), path)
+            # Stream rỗng thì không có pose để lưu
+            if SAVE_POSES and segments:
+                body = NumPyPoseBody(fps=segments[0].body.fps,
+                                     data=np.concatenate([np.ma.getdata(s.body.data) for s in segments]),
+                                     confidence=np.concatenate([s.body.confidence for s in segments]))
+                Thread(target=self.save_pose, args=(Pose(segments[0].header, body), key), daemon=True).start()
 
+        try:
+            key = output_key(sentences, LEXICON_DIR)
+            if RenderSettings.streaming:
+                # Cả task render lẫn các task chờ chung khoá đều đọc được video trong lúc nó đang được ghi
+                self.stream_keys[task_id] = key
+                self.processing_status.update(task_id, stream=f"/stream/{task_id}")
+            with span("processor.render", task_id=task_id), peak_memory("processor.render"):
+                video = self.output_cache.get_or_create(key, create_stream if RenderSettings.streaming else create)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Render failed for %s", task_id)
             self.processing_status[task_id] = {"status": "error", "message": f"Lỗi tạo video: {str(e)}"}
             return None
+        finally:
+            self.stream_keys.pop(task_id, None)
 
+        self.processing_status[task_id] = {"status": "completed", "video": video}
+        return video
 
-    def process_text(self, text, task_id):
-        """Xử lý toàn bộ: text -> pose -> video"""
-        
-        pose_file = self.text_to_pose_direct(text, task_id)
-        if not pose_file:
-            return
-        
-        
-        self.pose_to_video(pose_file, task_id)
+    def process_batch(self, batch_id, items):
+        """Batch câu: gloss (nhiều câu một lần gọi) -> pose -> video, ba tầng chạy gối lên nhau"""
+        def gloss(items):
+            for item in items:
+                self.processing_status.update(item["task_id"], step="Đang chuyển text thành gloss...")
+            results = _text_to_gloss_batch(
+                texts=[item["text"] for item in items],
+                language="vi",
+                glosser=GLOSSER,
+                signed_language="vsl",
+                lexicon=LEXICON_DIR,
+                fallback_glosser=GLOSSER_FALLBACK
+            )
+            for item, sentences in zip(items, results):
+                if sentences:
+                    item["sentences"] = sentences
+                else:
+                    item["error"] = "Không tạo được gloss từ text"
+
+        def pose(item):
+            item["key"] = output_key(item["sentences"], LEXICON_DIR)
+            if self.output_cache.get(item["key"]) is not None:
+                return
+            item["pose"] = self.gloss_to_pose(item["sentences"], item["task_id"])
+            if item["pose"] is None:
+                raise RuntimeError(self.processing_status[item["task_id"]]["message"])
+
+        def render(item):
+            def create(path):
+                self.processing_status.update(item["task_id"], step="Đang tạo video từ pose...")
+                if SAVE_POSES:
+                    self.save_pose(item["pose"], item["key"])
+                render_video(item["pose"], path)
+
+            if "pose" in item:
+                video = self.output_cache.get_or_create(item["key"], create)
+            else:
+                video = self.output_cache.path(item["key"])
+            self.processing_status[item["task_id"]] = {"status": "completed", "video": video}
+
+        stages = [(gloss, BATCH_GLOSS_SIZE), (for_each(pose), 1), (for_each(render), 1)]
+        try:
+            with span("processor.batch", batch_id=batch_id, items=len(items)), peak_memory("processor.batch"):
+                for item in run_pipeline(items, stages):
+                    item.pop("pose", None)
+                    if "error" in item:
+                        STAGE_ERRORS.inc(stage="processor.batch_item")
+                        self.processing_status[item["task_id"]] = {"status": "error", "message": f"Lỗi: {item['error']}"}
+        finally:
+            batch_slots.release()
+            self.processing_status[batch_id] = {**self.processing_status.get(batch_id, {}), "status": "completed"}
 
 processor = VideoProcessor()
 
+# Số worker cố định cho từng tầng, chỉnh theo cấu hình máy
+scheduler = JobScheduler(
+    gloss=processor.gloss,
+    render=processor.render,
+    gloss_workers=int(os.environ.get("GLOSS_WORKERS", 4)),
+    render_workers=int(os.environ.get("RENDER_WORKERS", max(1, (os.cpu_count() or 2) // 2))),
+    max_queue=int(os.environ.get("MAX_QUEUE", 16)),
+)
+
+def collect_metrics():
+    """Số liệu đọc từ scheduler, các cache và client LLM mỗi lần /metrics được gọi"""
+    queues = scheduler.stats()
+    stages = ["gloss", "render"]
+    caches = {
+        # Lookup đang phục vụ: gói compiled nếu đã build, không thì CSV (có hoặc không có index SQLite)
+        "pose": _get_pose_lookup(LEXICON_DIR).stats(),
+        "gloss": get_gloss_cache().stats(),
+        "video": processor.output_cache.stats(),
+    }
+    llm = get_gemini_client().stats()
+    return [
+        ("text2sign_queue_depth", "gauge", "Tasks waiting for a worker",
+         [({"stage": stage}, queues[stage]["waiting"]) for stage in stages]),
+        ("text2sign_active_workers", "gauge", "Workers busy with a task",
+         [({"stage": stage}, queues[stage]["active"]) for stage in stages]),
+        ("text2sign_workers", "gauge", "Workers per stage",
+         [({"stage": stage}, queues[stage]["workers"]) for stage in stages]),
+        ("text2sign_tasks_in_flight", "gauge", "Accepted tasks not finished yet", [({}, queues["in_flight"])]),
+        ("text2sign_cache_hits_total", "counter", "Cache hits, lookups that waited for the same computation included",
+         [({"cache": name}, stats["hits"] + stats.get("coalesced", 0)) for name, stats in caches.items()]),
+        ("text2sign_cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("text2sign_llm_requests_total", "counter", "LLM requests, retries included", [({}, llm["requests"])]),
+        ("text2sign_llm_retries_total", "counter", "LLM requests retried after a transient error",
+         [({}, llm["retries"])]),
+        ("text2sign_llm_timeouts_total", "counter", "LLM requests or calls that timed out", [({}, llm["timeouts"])]),
+        ("text2sign_llm_failures_total", "counter", "LLM calls that failed after their retries",
+         [({}, llm["failures"])]),
+        ("text2sign_llm_in_flight", "gauge", "LLM requests in flight", [({}, llm["in_flight"])]),
+        ("text2sign_llm_prompt_tokens_total", "counter", "Prompt tokens sent to the LLM, as counted by the model",
+         [({}, llm["prompt_tokens"])]),
+        ("process_resident_memory_bytes", "gauge", "Resident memory", [({}, rss_bytes())]),
+        ("text2sign_max_resident_memory_bytes", "gauge", "Highest resident memory since the start",
+         [({}, max_rss_bytes())]),
+    ]
+
+REGISTRY.collector(collect_metrics)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -145,15 +327,211 @@ def convert_text():
     
     task_id = str(uuid.uuid4())
     
-    thread = Thread(target=processor.process_text, args=(text, task_id))
-    thread.start()
+    processor.processing_status[task_id] = {"status": "processing", "step": "Đang chờ trong hàng đợi..."}
+    if not scheduler.submit(task_id, text):
+        processor.processing_status.pop(task_id, None)
+        response = jsonify({"error": "Máy chủ đang quá tải, vui lòng thử lại sau"})
+        response.headers["Retry-After"] = str(scheduler.retry_after())
+        return response, 429
     
     return jsonify({"task_id": task_id})
 
+@app.route('/convert/pose', methods=['POST'])
+def convert_to_pose():
+    """Pose của câu ở dạng nhị phân gọn (xem wire.py) để trình duyệt tự vẽ, không render video"""
+    data = request.json or {}
+    text = data.get('text', '')
+    face = bool(data.get('face', True))
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({"error": "Vui lòng nhập văn bản"}), 400
+
+    gloss_arguments = dict(text=text, language="vi", glosser=GLOSSER, signed_language="vsl", lexicon=LEXICON_DIR,
+                           fallback_glosser=GLOSSER_FALLBACK)
+
+    def pose_etag(sentences):
+        # Cùng chuỗi gloss và từ điển thì cùng pose: trình duyệt đã có thì không gửi lại
+        return f"{output_key(sentences, LEXICON_DIR)}-{POSE_WIRE_VERSION}-{int(face)}"
+
+    # Gloss có sẵn (từ điển hoặc cache) thì trả lời 304 ngay, không chiếm chỗ trong hàng đợi và không gọi LLM
+    if request.if_none_match:
+        cached = _cached_text_to_gloss(**gloss_arguments)
+        if cached and request.if_none_match.contains(pose_etag(cached)):
+            return Response(status=304, headers={"ETag": f'"{pose_etag(cached)}"'})
+
+    # Chung giới hạn với /convert: quá tải thì 429, không chạy thêm trên luồng của request
+    if not scheduler.admit():
+        response = jsonify({"error": "Máy chủ đang quá tải, vui lòng thử lại sau"})
+        response.headers["Retry-After"] = str(scheduler.retry_after())
+        return response, 429
+
+    try:
+        with span("processor.pose", face=face):
+            sentences = _text_to_gloss(**gloss_arguments)
+            if not sentences:
+                STAGE_ERRORS.inc(stage="processor.pose")
+                return jsonify({"error": "Không tạo được gloss từ text"}), 422
+
+            etag = pose_etag(sentences)
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+            pose = _gloss_to_pose(sentences=sentences, lexicon=LEXICON_DIR, spoken_language="vi",
+                                  signed_language="vsl")
+            body, encoding = compress(encode_pose(pose, face=face), request.headers.get("Accept-Encoding", ""))
+    except Exception as e:
+        logger.exception("Pose failed")
+        STAGE_ERRORS.inc(stage="processor.pose")
+        return jsonify({"error": f"Lỗi: {str(e)}"}), 500
+    finally:
+        scheduler.release()
+
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype=MEDIA_TYPE, headers=headers)
+
+@app.route('/convert/batch', methods=['POST'])
+def convert_batch():
+    """Nhận {"texts": [...]} hoặc {"items": [{"id", "text"}]}, mỗi câu có task_id và trạng thái riêng"""
+    data = request.json or {}
+    items = data.get('items') or [{"text": text} for text in data.get('texts', [])]
+    items = [{"id": str(item.get("id", i)), "text": item.get("text", "")} for i, item in enumerate(items)
+             if isinstance(item, dict)]
+    if not items or not all(isinstance(item["text"], str) and item["text"].strip() for item in items):
+        return jsonify({"error": "Vui lòng nhập danh sách văn bản (không có câu rỗng)"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Tối đa {BATCH_MAX_ITEMS} câu mỗi batch"}), 400
+
+    if not batch_slots.acquire(blocking=False):
+        response = jsonify({"error": "Máy chủ đang xử lý batch khác, vui lòng thử lại sau"})
+        response.headers["Retry-After"] = "30"
+        return response, 429
+
+    batch_id = str(uuid.uuid4())
+    for item in items:
+        item["task_id"] = str(uuid.uuid4())
+        processor.processing_status[item["task_id"]] = {"status": "processing", "step": "Đang chờ trong batch..."}
+    processor.processing_status[batch_id] = {
+        "status": "processing",
+        "items": [{"id": item["id"], "task_id": item["task_id"]} for item in items],
+    }
+    Thread(target=processor.process_batch, args=(batch_id, items), daemon=True).start()
+
+    return jsonify({"batch_id": batch_id, "items": processor.processing_status[batch_id]["items"]})
+
+@app.route('/convert/batch/<batch_id>')
+def get_batch_status(batch_id):
+    batch = processor.processing_status.get(batch_id)
+    if batch is None or "items" not in batch:
+        return jsonify({"status": "not_found"}), 404
+
+    items = [{**item, **processor.processing_status.get(item["task_id"], {"status": "not_found"})}
+             for item in batch["items"]]
+    counts = {}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    return jsonify({"status": batch["status"], "counts": counts, "items": items})
+
+def with_queue_position(task_id, status):
+    position = scheduler.position(task_id)
+    if position is not None:
+        status = {**status, **position,
+                  "step": f"Đang chờ trong hàng đợi (vị trí {position['queue_position']})..."}
+    return status
+
 @app.route('/status/<task_id>')
 def get_status(task_id):
     status = processor.processing_status.get(task_id, {"status": "not_found"})
-    return jsonify(status)
+    return jsonify(with_queue_position(task_id, status))
+
+@app.route('/events/<task_id>')
+def stream_status(task_id):
+    """Server-Sent Events: đẩy trạng thái mỗi khi thay đổi, kết thúc khi task xong"""
+    def events():
+        if task_id not in processor.processing_status:
+            yield f"data: {json.dumps({'status': 'not_found'})}\n\n"
+            return
+
+        version = -1
+        sent = None
+        while True:
+            # Vị trí trong hàng đợi không tạo ra sự kiện, nên khi đang chờ thì kiểm tra lại mỗi giây
+            timeout = 1 if scheduler.position(task_id) is not None else 15
+            version, status = processor.processing_status.wait(task_id, version, timeout=timeout)
+            if status is None:
+                yield f"data: {json.dumps({'status': 'not_found'})}\n\n"
+                return
+
+            status = with_queue_position(task_id, status)
+            if status != sent:
+                sent = status
+                yield f"data: {json.dumps(status, ensure_ascii=False)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+            if status.get("status") in FINISHED:
+                return
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/stream/<task_id>')
+def stream_video(task_id):
+    """Video MP4 phân mảnh của task, gửi dần trong lúc đang render"""
+    key = processor.stream_keys.get(task_id)
+    if key is None:
+        return "Stream not found", 404
+
+    def finished():
+        status = processor.processing_status.get(task_id)
+        return status is None or status.get("status") in FINISHED
+
+    def chunks():
+        # File tạm được đổi tên khi render xong, nên thử cả hai đường dẫn
+        video = None
+        while video is None:
+            done = finished()
+            for path in (processor.output_cache.partial_path(key), processor.output_cache.path(key)):
+                try:
+                    video = open(path, "rb")
+                    break
+                except FileNotFoundError:
+                    pass
+            if video is None:
+                if done:
+                    return
+                time.sleep(0.05)
+
+        with video:
+            while True:
+                done = finished()
+                chunk = video.read(64 * 1024)
+                if chunk:
+                    yield chunk
+                elif done:
+                    return
+                else:
+                    time.sleep(0.05)
+
+    return Response(stream_with_context(chunks()), mimetype="video/mp4",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/scheduler/stats')
+def get_scheduler_stats():
+    return jsonify({**scheduler.stats(), "llm": get_gemini_client().stats()})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus: thời gian từng bước (histogram), lỗi, cache, LLM, hàng đợi"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    return jsonify({
+        "poses": _get_pose_lookup(LEXICON_DIR).stats(),
+        "glosses": get_gloss_cache().stats(),
+        "videos": processor.output_cache.stats(),
+    })
 
 # Route cũ cho video
 @app.route('/video/<filename>')
@@ -0,0 +1,93 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+
+sys.path.append('.')
+from spoken_to_signed.gloss_to_pose.lookup.pose_cache import copy_pose
+from spoken_to_signed.gloss_to_pose.smoothing import create_padding, find_best_connection_point, \
+    pose_savgol_filter, smooth_concatenate_poses
+from benchmarks.synthetic import synthetic_holistic_pose
+
+
+def previous_smooth_concatenate_poses(poses, padding=0.20):
+    # The previous implementation: cut every pose at its joins, write them all with zero padding between them,
+    # interpolate every missing point of the whole sentence with pose_format, then smooth
+    start = 0
+    for i, pose in enumerate(poses):
+        if i != len(poses) - 1:
+            end, next_start = find_best_connection_point(poses[i], poses[i + 1])
+        else:
+            end, next_start = len(pose.body.data), None
+        pose.body = pose.body[start:end]
+        start = next_start
+
+    padding_frames = len(create_padding(padding, poses[0]).data)
+    data = np.concatenate([np.concatenate((np.ma.getdata(p.body.data),
+                                           np.zeros((padding_frames, *p.body.data.shape[1:]), dtype=np.float32)))
+                           for p in poses])[:-padding_frames]
+    confidence = np.concatenate([np.concatenate((p.body.confidence,
+                                                 np.zeros((padding_frames, *p.body.confidence.shape[1:]),
+                                                          dtype=np.float32)))
+                                 for p in poses])[:-padding_frames]
+    body = NumPyPoseBody(fps=poses[0].body.fps, data=data, confidence=confidence).interpolate(kind='linear')
+    body.data = body.data.astype(np.float32)
+    body.confidence = body.confidence.astype(np.float32)
+    return pose_savgol_filter(Pose(poses[0].header, body))
+
+
+def signs(count: int, frames: int, gap: range):
+    """Synthetic signs, where the hands of every other sign drop out for a few frames in its middle"""
+    return [synthetic_holistic_pose(frames, seed=i, hands_missing=gap if i % 2 == 1 else None) for i in range(count)]
+
+
+def check_same(previous: Pose, current: Pose, name: str):
+    assert previous.body.data.shape == current.body.data.shape, name
+    assert np.allclose(previous.body.confidence, current.body.confidence, atol=1e-5), name
+    difference = np.abs(np.ma.getdata(previous.body.data) - np.ma.getdata(current.body.data)).max()
+    assert difference < 1e-3, f"{name}: {difference:.1f}px off the previous implementation"
+
+
+def best_time(concatenate, poses, repeat: int) -> float:
+    # Both implementations cut or smooth in place, so every run gets fresh poses
+    times = []
+    for _ in range(repeat):
+        copies = [copy_pose(p) for p in poses]
+        start = time.perf_counter()
+        concatenate(copies)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Compare the incremental and whole-sentence concatenation")
+    args_parser.add_argument("--signs", type=int, nargs="+", default=[4, 16])
+    args_parser.add_argument("--frames", type=int, default=60)
+    args_parser.add_argument("--repeat", type=int, default=3)
+    args = args_parser.parse_args()
+
+    # The hands absent from a whole short sign are interpolated from the signs around it, like before
+    poses = [synthetic_holistic_pose(30, seed=0), synthetic_holistic_pose(12, seed=1, hands_missing=range(12)),
+             synthetic_holistic_pose(30, seed=2)]
+    check_same(previous_smooth_concatenate_poses([copy_pose(p) for p in poses]),
+               smooth_concatenate_poses([copy_pose(p) for p in poses]), "hands missing from a whole sign")
+
+    for count in args.signs:
+        poses = signs(count, args.frames, gap=range(25, 30))
+        # Points missing inside a sign are interpolated within it, like before
+        check_same(previous_smooth_concatenate_poses([copy_pose(p) for p in poses]),
+                   smooth_concatenate_poses([copy_pose(p) for p in poses]), f"{count} signs")
+
+        previous_time = best_time(previous_smooth_concatenate_poses, poses, args.repeat)
+        current_time = best_time(smooth_concatenate_poses, poses, args.repeat)
+        print(f"{count:>3} signs: previous {previous_time * 1000:8.2f}ms, "
+              f"incremental {current_time * 1000:8.2f}ms, speedup x{previous_time / current_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_concatenate.py --signs 4 16
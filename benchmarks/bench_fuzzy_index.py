@@ -0,0 +1,121 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+import unicodedata
+
+sys.path.append('.')
+from spoken_to_signed.gloss_to_pose.lookup.fuzzy_index import FuzzyIndex, distance
+from spoken_to_signed.text_normalization import fold
+
+ONSETS = ["", "b", "c", "ch", "d", "đ", "g", "gi", "h", "kh", "l", "m", "n", "ng", "nh", "ph", "qu", "s", "t", "th",
+          "tr", "v", "x"]
+RHYMES = ["a", "ac", "ach", "ai", "am", "an", "ang", "anh", "ao", "ap", "at", "au", "ay", "ăm", "ăn", "ăng", "ăt", "âm",
+          "ân", "âng", "ât", "âu", "ây", "e", "em", "en", "eo", "et", "ê", "ên", "ênh", "êt", "êu", "i", "ia", "im", "in",
+          "inh", "it", "iêm", "iên", "iêt", "iêu", "o", "oa", "oai", "oan", "oang", "oanh", "oc", "oi", "om", "on",
+          "ong", "ot", "ô", "ôi", "ôm", "ôn", "ông", "ôt", "ơ", "ơi", "ơm", "ơn", "u", "ua", "uân", "uât", "uc", "ui",
+          "um", "un", "ung", "uôc", "uôi", "uôn", "uông", "ut", "uy", "uyên", "uyêt", "ư", "ưa", "ưc", "ưi", "ưng",
+          "ươc", "ươi", "ươn", "ương", "ươt", "ưu"]
+TONES = ["", "\u0300", "\u0301", "\u0309", "\u0303", "\u0323"]
+
+
+def syllable(rng: random.Random) -> str:
+    rhyme = rng.choice(RHYMES)
+    # The tone mark goes on the first vowel of the rhyme
+    return unicodedata.normalize("NFC", rng.choice(ONSETS) + rhyme[0] + rng.choice(TONES) + rhyme[1:])
+
+
+def synthetic_terms(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < count:
+        terms.add(" ".join(syllable(rng) for _ in range(rng.randint(1, 3))))
+    return sorted(terms)
+
+
+def misspell(term: str, rng: random.Random) -> str:
+    """Without diacritics, or with one letter replaced"""
+    if rng.random() < 0.5:
+        return fold(term)
+    i = rng.randrange(len(term))
+    return term[:i] + rng.choice("abcdeghiklmnoprstuvxy") + term[i + 1:]
+
+
+def one_edit(term: str, rng: random.Random) -> str:
+    """One letter replaced, inserted or deleted"""
+    i = rng.randrange(len(term))
+    letter = rng.choice("abcdeghiklmnoprstuvxyàáạảãâăđêôơư")
+    return rng.choice([term[:i] + letter + term[i + 1:], term[:i] + letter + term[i:], term[:i] + term[i + 1:]])
+
+
+def check_against_scan(terms: list, queries: int, seed: int = 2):
+    """The closest term found is as close as the closest of a scan over the whole lexicon"""
+    # Repeated syllables have few distinct trigrams, their candidates can not rely on shared trigrams
+    repeated = [word for word in terms[:len(terms) // 10] if " " not in word]
+    terms = terms + [f"{word} {word}" for word in repeated] + [f"a {word} {word}" for word in repeated]
+    index = FuzzyIndex(terms)
+    rng = random.Random(seed)
+    by_length = {}
+    for term in index.terms:
+        by_length.setdefault(len(term), []).append(term)
+
+    for term in rng.sample(terms, queries):
+        query = unicodedata.normalize("NFC", one_edit(term, rng)).lower()
+        limit = index.max_distance(query)
+        # A term more than the limit longer or shorter is more than the limit away
+        band = [other for length in range(len(query) - int(limit), len(query) + int(limit) + 1)
+                for other in by_length.get(length, [])]
+        best = min([distance(query, other, limit) for other in band], default=float("inf"))
+        matches = index.search(query, limit=1)
+        found = matches[0][1] if matches else float("inf")
+        assert found == best or (best > limit and not matches), f"{query!r}: found {matches}, the scan {best}"
+    print(f"{'check':>12}: {queries} one-edit queries, the same closest distance as a scan over {len(terms)} terms")
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Fuzzy matching of out of vocabulary words in a large lexicon")
+    args_parser.add_argument("--entries", type=int, default=120000)
+    args_parser.add_argument("--queries", type=int, default=2000)
+    args_parser.add_argument("--linear-queries", type=int, default=10, help="Queries timed with a linear scan")
+    args_parser.add_argument("--check-entries", type=int, default=5000, help="Lexicon checked against a scan")
+    args_parser.add_argument("--check-queries", type=int, default=1600)
+    args = args_parser.parse_args()
+
+    check_against_scan(synthetic_terms(args.check_entries), args.check_queries)
+
+    terms = synthetic_terms(args.entries)
+    rng = random.Random(1)
+    queries = [(misspell(term, rng), term) for term in rng.sample(terms, args.queries)]
+
+    start = time.perf_counter()
+    index = FuzzyIndex(terms)
+    print(f"{'build':>12}: {(time.perf_counter() - start) * 1000:9.1f}ms, {len(index)} terms")
+
+    # closest is what the lookup calls, search returns the candidates (FuzzySettings.limit)
+    for name, limit in [("closest", 1), ("search", None)]:
+        times = []
+        found = 0
+        recovered = 0
+        for query, term in queries:
+            start = time.perf_counter()
+            matches = index.search(query, limit)
+            times.append(time.perf_counter() - start)
+            found += len(matches) > 0
+            recovered += term in [match for match, _ in matches]
+        times = sorted(times)
+        print(f"{name:>12}: {statistics.median(times) * 1e6:9.1f}µs median, "
+              f"{times[int(len(times) * 0.99)] * 1e6:.1f}µs p99, "
+              f"{found} of {len(queries)} matched, {recovered} with the intended term")
+
+    # What find_closest_word would do: the distance to every term of the lexicon
+    start = time.perf_counter()
+    for query, _ in queries[:args.linear_queries]:
+        min(terms, key=lambda term: distance(query, term, 2.0))
+    print(f"{'linear scan':>12}: {(time.perf_counter() - start) / args.linear_queries * 1e6:9.1f}µs per query")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_fuzzy_index.py --entries 120000 --check-queries 1600
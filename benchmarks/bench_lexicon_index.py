@@ -0,0 +1,85 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append('.')
+from spoken_to_signed.gloss_to_pose.lookup.csv_lookup import CSVPoseLookup
+from spoken_to_signed.gloss_to_pose.lookup.lexicon_index import build_lexicon_index
+
+SYLLABLES = ["anh", "bạn", "chào", "đi", "học", "yêu", "tôi", "nhà", "trường", "mẹ", "cha", "ăn", "uống", "ngủ",
+             "chơi", "làm", "việc", "sách", "vở", "bút", "xe", "máy", "đường", "phố", "cây", "hoa", "lá", "nước"]
+
+
+def synthetic_index(directory: str, entries: int, variants: int, seed: int = 0) -> list:
+    """index.csv of distinct words of one to three syllables, each with a few variants (poses are not written)"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < entries // variants:
+        words.add(" ".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) + f" {len(words)}")
+    words = sorted(words)
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "index.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "spoken_language", "signed_language", "start", "end", "words", "glosses", "priority"])
+        for i, word in enumerate(words):
+            for variant in range(variants):
+                writer.writerow([f"vsl/{i}_{variant}.pose", "vi", "vsl", 0, 0, word, word.upper(), variant])
+    return words
+
+
+def measure(name: str, run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>24}: {seconds * 1000:9.1f}ms, {current / 2 ** 20:7.1f}MB held, {peak / 2 ** 20:7.1f}MB peak")
+    return result
+
+
+def time_lookups(name: str, lookup: CSVPoseLookup, terms: list):
+    index = lookup.words_index["vi"]["vsl"]
+    start = time.perf_counter()
+    found = 0
+    for term in terms:
+        if term in index:
+            found += len(lookup.get_best_row(index[term], term)["path"]) > 0
+    seconds = time.perf_counter() - start
+    print(f"{name:>24}: {seconds / len(terms) * 1e6:9.1f}µs per lookup ({found} of {len(terms)} found)")
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="CSV lexicon against the built SQLite index, for large lexicons")
+    args_parser.add_argument("--entries", type=int, default=120000)
+    args_parser.add_argument("--variants", type=int, default=3, help="Entries per word")
+    args_parser.add_argument("--lookups", type=int, default=10000)
+    args = args_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        words = synthetic_index(directory, args.entries, args.variants)
+        rng = random.Random(1)
+        terms = [rng.choice(words) if i % 4 else f"không có {i}" for i in range(args.lookups)]
+
+        csv_lookup = measure("CSVPoseLookup (csv)", lambda: CSVPoseLookup(directory))
+        time_lookups("lookup (csv)", csv_lookup, terms)
+        del csv_lookup
+
+        measure("build_lexicon_index", lambda: build_lexicon_index(directory))
+        print(f"{'':>24}  {os.path.getsize(os.path.join(directory, 'index.sqlite')) / 2 ** 20:.1f}MB on disk, "
+              f"index.csv {os.path.getsize(os.path.join(directory, 'index.csv')) / 2 ** 20:.1f}MB")
+        indexed_lookup = measure("CSVPoseLookup (index)", lambda: CSVPoseLookup(directory))
+        time_lookups("lookup (index)", indexed_lookup, terms)
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_lexicon_index.py --entries 120000
@@ -0,0 +1,63 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append('.')
+from spoken_to_signed.bin import _gloss_to_pose
+from spoken_to_signed.metrics import peak_memory
+from spoken_to_signed.pose_to_video.renderer import RenderSettings, render_video
+from benchmarks.suite import stub_text_to_gloss
+from benchmarks.synthetic import synthetic_lexicon
+
+
+def measure(name: str, run, traced=True):
+    """
+    Peak of the resident memory over one run, and of the traced allocations (NumPy's included).
+    Tracing slows pure Python code down a lot (drawing), where only the resident memory is measured.
+    """
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with peak_memory(name) as rss, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = run()
+    seconds = time.perf_counter() - start
+    traced_peak = "" if not traced else f"traced peak {tracemalloc.get_traced_memory()[1] / 2 ** 20:8.1f}MB, "
+    tracemalloc.stop()
+    print(f"{name:>14}: {traced_peak}RSS peak +{rss['peak_bytes'] / 2 ** 20:8.1f}MB, {seconds * 1000:8.1f}ms")
+    return result
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Peak memory of one request, on a synthetic lexicon")
+    args_parser.add_argument("--entries", type=int, default=20, help="Lexicon entries")
+    args_parser.add_argument("--frames", type=int, default=100, help="Frames per lexicon entry")
+    args_parser.add_argument("--face-points", type=int, default=468)
+    args_parser.add_argument("--words", type=int, default=12, help="Signs in the sentence")
+    args = args_parser.parse_args()
+
+    RenderSettings.draw_workers = 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        lexicon = os.path.join(directory, "lexicon")
+        words = synthetic_lexicon(lexicon, args.entries, args.frames, args.face_points)
+        sentence = " ".join(words[i * 7 % len(words)] for i in range(args.words))
+        glosses = stub_text_to_gloss(sentence)
+
+        # Once to fill the pose cache, the measured runs only see the request's own allocations
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            _gloss_to_pose(glosses, lexicon, "vi", "vsl")
+
+        pose = measure("gloss_to_pose", lambda: _gloss_to_pose(glosses, lexicon, "vi", "vsl"))
+        print(f"{'':>14}  {len(pose.body.data)} frames, {pose.body.data.dtype}, "
+              f"{pose.body.data.nbytes / 2 ** 20:.1f}MB of data")
+        measure("render", lambda: render_video(pose, os.path.join(directory, "video.mp4")), traced=False)
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_memory.py --words 12 --frames 100
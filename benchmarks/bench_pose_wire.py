@@ -0,0 +1,69 @@
+import argparse
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append('.')
+from spoken_to_signed.pose_to_video.renderer import RenderSettings, render_video
+from spoken_to_signed.pose_to_video.wire import FACE_COMPONENT, compress, decode_pose, encode_pose
+from benchmarks.synthetic import synthetic_holistic_pose
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Payload and server CPU time: MP4 video or pose for the browser")
+    args_parser.add_argument("--frames", type=int, default=250)
+    args_parser.add_argument("--skip-video", action="store_true", help="Only the pose encodings")
+    args = args_parser.parse_args()
+
+    RenderSettings.draw_workers = 1
+    pose = synthetic_holistic_pose(args.frames)
+    buffer = io.BytesIO()
+    pose.write(buffer)
+    print(f"{'.pose file':>16}: {len(buffer.getvalue()) / 1024:8.1f}KB")
+
+    if not args.skip_video:
+        with tempfile.TemporaryDirectory() as directory:
+            video_path = os.path.join(directory, "video.mp4")
+            start = time.process_time()
+            render_video(pose, video_path)
+            elapsed = time.process_time() - start
+            print(f"{'mp4':>16}: {os.path.getsize(video_path) / 1024:8.1f}KB, {elapsed * 1000:8.1f}ms CPU")
+
+    for face in [True, False]:
+        start = time.process_time()
+        data = encode_pose(pose, face=face)
+        encoded = time.process_time() - start
+        label = "" if face else ", no face"
+        print(f"{'wire' + label:>16}: {len(data) / 1024:8.1f}KB, {encoded * 1000:8.1f}ms CPU")
+        for encoding in ["gzip", "br"]:
+            start = time.process_time()
+            body, used = compress(data, encoding)
+            elapsed = time.process_time() - start
+            if used != encoding:
+                print(f"{encoding + label:>16}: not available")
+                continue
+            print(f"{encoding + label:>16}: {len(body) / 1024:8.1f}KB, {(encoded + elapsed) * 1000:8.1f}ms CPU")
+
+        # What the browser draws, against the pose on the server
+        decoded = decode_pose(gzip.decompress(compress(data, "gzip")[0]))
+        points, first = [], 0
+        for component in pose.header.components:
+            if face or component.name != FACE_COMPONENT:
+                points += range(first, first + len(component.points))
+            first += len(component.points)
+        original = pose.body.data[:, 0, points, :2]
+        visible = decoded["visible"]
+        error = np.abs(decoded["xy"] - original)[visible].max()
+        print(f"{'':>16}  max error {error:.4f}px, visibility "
+              f"{'exact' if (visible == (pose.body.confidence[:, 0, points] > 0)).all() else 'WRONG'}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_pose_wire.py --frames 250
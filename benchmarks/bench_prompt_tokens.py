@@ -0,0 +1,71 @@
+import argparse
+import re
+import sys
+
+sys.path.append('.')
+from spoken_to_signed.text_to_gloss import gpt
+from spoken_to_signed.text_to_gloss.fingerspelling import mask_spelled
+from spoken_to_signed.text_to_gloss.gemini_client import get_gemini_client, run_sync
+from benchmarks.bench_fuzzy_index import synthetic_terms
+
+SENTENCES = [
+    "Xin chào, tôi tên là Thành",
+    "Thầy tôi đang ôn đánh giá năng lực cho lớp tôi",
+    "Hằng ngày em gái tôi đi học bằng xe máy",
+    "Bạn tên là gì?",
+    "Chúng tôi nghiên cứu ngôn ngữ kí hiệu Việt Nam",
+    "Mẹ tôi nấu nướng ở ngoài",
+    "Xin lỗi, tôi nhầm lẫn",
+    "Học tập và suy nghĩ mỗi ngày cho sức khỏe",
+    "Anh ruột tôi dạy khoa học ở Trung Quốc",
+    "Tôi yêu bạn, đúng không?",
+]
+
+PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    # Words and punctuation marks, without the model's tokenizer (see --count-with-api)
+    return len(PIECE_PATTERN.findall(text))
+
+
+def prompts(pruned: bool) -> list:
+    gpt.PRUNE_VOCABULARY = pruned
+    masked = [mask_spelled(sentence, gpt.get_vocab_trie().covered)[0] for sentence in SENTENCES]
+    return [gpt.build_prompt(masked_text) for masked_text in masked] + [gpt.build_batch_prompt(masked)]
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Prompt size of the Gemini glosser, whole vocabulary or pruned")
+    args_parser.add_argument("--vocabulary", type=int, default=0,
+                             help="Synthetic entries added to the vocabulary, as for a larger lexicon")
+    args_parser.add_argument("--count-with-api", action="store_true",
+                             help="Count tokens with Gemini's countTokens (GEMINI_API_KEY) instead of estimating")
+    args = args_parser.parse_args()
+
+    if args.vocabulary:
+        gpt.VOCAB_LIST = gpt.VOCAB_LIST + synthetic_terms(args.vocabulary)
+        gpt.get_vocab_syllable_index.cache_clear()
+
+    def count(prompt: str) -> int:
+        if args.count_with_api:
+            return run_sync(get_gemini_client().count_tokens(prompt))
+        return estimate_tokens(prompt)
+
+    unit = "tokens" if args.count_with_api else "tokens (estimated)"
+    print(f"Vocabulary of {len(gpt.VOCAB_LIST)} entries, {unit}, whole vocabulary -> pruned")
+    names = SENTENCES + [f"batch of {len(SENTENCES)}"]
+    before_total = after_total = 0
+    for name, before, after in zip(names, prompts(pruned=False), prompts(pruned=True)):
+        before, after = count(before), count(after)
+        before_total += before
+        after_total += after
+        print(f"{before:7} -> {after:6} ({after / before:4.0%})  {name}")
+    print(f"{before_total:7} -> {after_total:6} ({after_total / before_total:4.0%})  total")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_prompt_tokens.py
+# python benchmarks/bench_prompt_tokens.py --vocabulary 5000
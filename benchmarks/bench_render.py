@@ -0,0 +1,44 @@
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+from spoken_to_signed.pose_to_video.renderer import RenderSettings, get_draw_pool, render_video
+from benchmarks.synthetic import synthetic_holistic_pose
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Compare serial and parallel frame drawing")
+    args_parser.add_argument("--frames", type=int, default=200)
+    args_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = args_parser.parse_args()
+
+    # Pools are started before anything else runs, like in the app
+    for workers in args.workers:
+        if workers > 1:
+            get_draw_pool(workers)
+
+    pose = synthetic_holistic_pose(args.frames)
+    digests = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in args.workers:
+            RenderSettings.draw_workers = workers
+            video_path = os.path.join(directory, f"{workers}.mp4")
+            start = time.perf_counter()
+            render_video(pose, video_path)
+            elapsed = time.perf_counter() - start
+            with open(video_path, "rb") as f:
+                digests[workers] = hashlib.sha256(f.read()).hexdigest()
+            print(f"{workers:>3} workers: {elapsed:6.2f}s ({args.frames / elapsed:6.1f} frames/s)")
+
+    assert len(set(digests.values())) == 1, "Parallel rendering changed the video"
+    print("All videos are byte-identical")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_render.py --frames 200 --workers 1 2 4
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.append('.')
+from benchmarks.suite import regressions
+from benchmarks.synthetic import synthetic_lexicon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# Only imported where they are used, never when the app or the CLI start
+HEAVY_MODULES = ["scipy", "scipy.signal", "cv2", "matplotlib", "pose_format.pose_visualizer", "httpx",
+                 "google.generativeai"]
+
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+result = {{"import": imported - start, "heavy_modules": sorted(m for m in {heavy!r} if m in sys.modules)}}
+if {request!r}:
+    client = app.app.test_client()
+    task_id = client.post("/convert", json={{"text": {request!r}}}).get_json()["task_id"]
+    while client.get(f"/status/{{task_id}}").get_json()["status"] not in ("completed", "error"):
+        time.sleep(0.01)
+    result["first_request"] = time.perf_counter() - imported
+    result["status"] = client.get(f"/status/{{task_id}}").get_json()["status"]
+print(json.dumps(result))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def top_imports(importtime: str, count: int) -> list:
+    """Slowest top level imports (cumulative microseconds) from the python -X importtime report"""
+    imports = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and name.startswith(" ") and not name.startswith("   "):
+            imports.append((int(cumulative), name.strip()))
+    imports = sorted(imports, reverse=True)[:count]
+    return [{"module": name, "ms": microseconds / 1000} for microseconds, name in imports]
+
+
+def run_child(module: str, request: str, assets: str) -> dict:
+    # A fresh interpreter in a fresh directory each time, without cached glosses or videos: the cold start
+    with tempfile.TemporaryDirectory() as directory:
+        os.symlink(assets, os.path.join(directory, "assets"))
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join([ROOT] + [os.path.abspath(p) for p in sys.path if p]),
+                   GLOSSER="trie", GLOSS_CACHE_PATH=os.path.join(directory, "gloss_cache.db"),
+                   DRAW_WORKERS="1", WARMUP="0")
+        code = CHILD.format(module=module, heavy=HEAVY_MODULES, request=request)
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=directory, env=env,
+                                 capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["top_imports"] = top_imports(process.stderr, 5)
+    return result
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Cold start of the app and the CLI: import time and first request")
+    args_parser.add_argument("--repeat", type=int, default=3)
+    args_parser.add_argument("--words", type=int, default=2, help="Signs in the first request")
+    args_parser.add_argument("--output", type=str, help="Write the results (JSON) to this file instead of stdout")
+    args_parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    args_parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args_parser.add_argument("--check", action="store_true",
+                             help="Exit with an error if startup regressed or a heavy module is imported eagerly")
+    args_parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown, relative")
+    args_parser.add_argument("--min-delta", type=float, default=0.05, help="Allowed slowdown, in seconds")
+    args = args_parser.parse_args()
+
+    config = {"words": args.words}
+    results = {"config": config, "stages": {}, "heavy_modules": {}, "top_imports": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        # The app reads its lexicon from assets/vietnamese_lexicon, relative to where it runs
+        assets = os.path.join(directory, "assets")
+        lexicon = os.path.join(assets, "vietnamese_lexicon")
+        words = synthetic_lexicon(lexicon, entries=10, frames=20, face_points=468)
+        sentence = " ".join(words[:args.words])
+
+        for name, module, request in [("cli", "spoken_to_signed.bin", ""), ("app", "app", sentence)]:
+            runs = [run_child(module, request, assets) for _ in range(args.repeat)]
+            for measure in ["import", "first_request"]:
+                if measure in runs[0]:
+                    times = [run[measure] for run in runs]
+                    results["stages"][f"{name}_{measure}"] = {"median": statistics.median(times), "min": min(times),
+                                                              "repeat": args.repeat}
+                    print(f"{name + '_' + measure:>20}: {statistics.median(times) * 1000:9.1f}ms", file=sys.stderr)
+            results["heavy_modules"][name] = runs[0]["heavy_modules"]
+            results["top_imports"][name] = runs[0]["top_imports"]
+            if runs[0].get("status", "completed") != "completed":
+                sys.exit(f"The first request of the app failed: {runs[0]['status']}")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    eager = {name: modules for name, modules in results["heavy_modules"].items() if modules}
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    elif args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = [f"{name} imports {', '.join(modules)} at startup" for name, modules in eager.items()]
+        problems += regressions(results, baseline, args.tolerance, args.min_delta)
+        if problems:
+            sys.exit("Startup regressed:\n" + "\n".join(problems))
+        print("No regression", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_startup.py --save-baseline
+# python benchmarks/bench_startup.py --check
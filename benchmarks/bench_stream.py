@@ -0,0 +1,64 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append('.')
+from spoken_to_signed.bin import _gloss_to_pose, _gloss_to_pose_stream
+from benchmarks.synthetic import synthetic_lexicon
+
+
+def quiet(run):
+    # The stages report their progress on stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return run()
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Check the streamed pose against the whole pose, "
+                                                      "and time its first segment")
+    args_parser.add_argument("--entries", type=int, default=8, help="Lexicon entries")
+    args_parser.add_argument("--frames", type=int, default=60, help="Frames per lexicon entry")
+    args_parser.add_argument("--words", type=int, default=12, help="Signs in the text")
+    args = args_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        lexicon = os.path.join(directory, "lexicon")
+        # Hands missing inside every other entry, and around the joins of some
+        words = synthetic_lexicon(lexicon, args.entries, args.frames, hands_missing=range(25, 30))
+        signs = [(word, word) for word in (words[i * 3 % len(words)] for i in range(args.words))]
+        inputs = {
+            "one sentence": [signs],
+            "a sentence per sign": [[sign] for sign in signs],
+            "three sentences": [signs[:4], signs[4:5], signs[5:]],
+        }
+
+        for name, sentences in inputs.items():
+            pose = quiet(lambda: _gloss_to_pose(sentences, lexicon, "vi", "vsl"))
+
+            start = time.perf_counter()
+            stream = quiet(lambda: _gloss_to_pose_stream(sentences, lexicon, "vi", "vsl"))
+            first = quiet(lambda: next(stream))
+            first_time = time.perf_counter() - start
+            segments = [first] + quiet(lambda: list(stream))
+            total_time = time.perf_counter() - start
+
+            # The same frames, so that the same output cache key holds the same video either way
+            data = np.concatenate([np.ma.getdata(s.body.data) for s in segments])
+            confidence = np.concatenate([s.body.confidence for s in segments])
+            assert data.shape == pose.body.data.shape, f"{name}: {len(data)} frames streamed, " \
+                                                       f"{len(pose.body.data)} in the whole pose"
+            assert np.allclose(data, np.ma.getdata(pose.body.data), atol=1e-3)
+            assert np.allclose(confidence, pose.body.confidence, atol=1e-5)
+            print(f"{name:>20}: {len(data)} frames in {len(segments)} segments, same as the whole pose, "
+                  f"first segment {first_time * 1000:.1f}ms of {total_time * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_stream.py --words 12
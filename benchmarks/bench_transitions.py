@@ -0,0 +1,37 @@
+import argparse
+import sys
+import time
+
+sys.path.append('.')
+from spoken_to_signed.gloss_to_pose.transitions import compute_transitions, transition_points, transition_vectors, \
+    window_size
+from benchmarks.synthetic import synthetic_holistic_pose
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Time building the transition table of a synthetic lexicon")
+    args_parser.add_argument("--entries", type=int, nargs="+", default=[100, 1000, 3000])
+    args_parser.add_argument("--frames", type=int, default=40)
+    args = args_parser.parse_args()
+
+    for entries in args.entries:
+        tails = []
+        heads = []
+        for seed in range(entries):
+            pose = synthetic_holistic_pose(args.frames, seed=seed)
+            window = window_size(args.frames, pose.body.fps)
+            points = transition_points(pose.header)
+            tails.append(transition_vectors(pose.body.data[-window:], points))
+            heads.append(transition_vectors(pose.body.data[:window], points))
+
+        start = time.perf_counter()
+        compute_transitions(tails, heads)
+        elapsed = time.perf_counter() - start
+        print(f"{entries:>5} entries: {entries ** 2:>9} pairs in {elapsed:7.2f}s "
+              f"({elapsed / entries ** 2 * 1e6:.2f}µs per pair)")
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/bench_transitions.py --entries 100 1000 3000
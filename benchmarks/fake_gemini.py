@@ -0,0 +1,116 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append('.')
+from spoken_to_signed.text_to_gloss.gemini_client import GeminiError, GeminiSettings, get_gemini_client
+
+NUMBERED_SENTENCE = re.compile(r'^\d+\. "', re.MULTILINE)
+
+
+class FakeGemini(BaseHTTPRequestHandler):
+    """generateContent with a fixed latency, and a share of failed (503) and hanging requests"""
+    latency = 0.2
+    failure_rate = 0.0
+    hang_rate = 0.0
+    reply = ["tôi", "yêu", "bạn"]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["contents"][0]["parts"][0]["text"]
+
+        roll = random.random()
+        if roll < self.hang_rate:
+            time.sleep(3600)
+        time.sleep(self.latency)
+        if roll < self.hang_rate + self.failure_rate:
+            self.send_response(503)
+            self.end_headers()
+            self.wfile.write(b'{"error": {"code": 503, "message": "overloaded"}}')
+            return
+
+        # One array per numbered sentence of a batch prompt
+        sentences = len(NUMBERED_SENTENCE.findall(prompt))
+        text = json.dumps([self.reply] * sentences if sentences else self.reply, ensure_ascii=False)
+        response = json.dumps({"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(response.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGemini)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Gloss against a local fake Gemini server")
+    args_parser.add_argument("--calls", type=int, default=100)
+    args_parser.add_argument("--threads", type=int, default=16, help="Callers, like the app's gloss workers")
+    args_parser.add_argument("--latency", type=float, default=0.2)
+    args_parser.add_argument("--failure-rate", type=float, default=0.2)
+    args_parser.add_argument("--hang-rate", type=float, default=0.05)
+    args_parser.add_argument("--max-concurrency", type=int, default=GeminiSettings.max_concurrency)
+    args_parser.add_argument("--deadline", type=float, default=5.0)
+    args_parser.add_argument("--attempt-timeout", type=float, default=1.0)
+    args_parser.add_argument("--serve", type=int, help="Only run the server on this port (for GEMINI_ENDPOINT)")
+    args = args_parser.parse_args()
+
+    FakeGemini.latency = args.latency
+    FakeGemini.failure_rate = args.failure_rate
+    FakeGemini.hang_rate = args.hang_rate
+
+    if args.serve is not None:
+        print(f"Fake Gemini on http://127.0.0.1:{args.serve}")
+        serve(args.serve).serve_forever()
+        return
+
+    server = serve()
+    GeminiSettings.endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    GeminiSettings.max_concurrency = args.max_concurrency
+    GeminiSettings.deadline = args.deadline
+    GeminiSettings.attempt_timeout = args.attempt_timeout
+
+    # The glosser itself, without its cache
+    from spoken_to_signed.text_to_gloss.gemini_client import run_sync
+    from spoken_to_signed.text_to_gloss.gpt import _llm_text_to_gloss
+
+    def call(i):
+        start = time.perf_counter()
+        try:
+            run_sync(_llm_text_to_gloss(f"tôi yêu bạn {i}", "vi", "vsl"))
+            error = None
+        except GeminiError as e:
+            error = str(e)
+        return time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        results = list(executor.map(call, range(args.calls)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    failed = [error for _, error in results if error is not None]
+    print(f"{args.calls} calls in {elapsed:.2f}s, {len(failed)} failed")
+    print(f"latency p50 {latencies[len(latencies) // 2]:.2f}s, p95 {latencies[int(len(latencies) * 0.95)]:.2f}s, "
+          f"max {latencies[-1]:.2f}s (deadline {args.deadline}s)")
+    print(get_gemini_client().stats())
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/fake_gemini.py --calls 100 --failure-rate 0.2 --hang-rate 0.05
+# python benchmarks/fake_gemini.py --serve 8089  # then GEMINI_ENDPOINT=http://127.0.0.1:8089 python app.py
@@ -0,0 +1,159 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+from spoken_to_signed.bin import _gloss_to_pose
+from spoken_to_signed.gloss_to_pose.concatenate import _scale_pose, normalize_pose, trim_pose
+from spoken_to_signed.gloss_to_pose.lookup.csv_lookup import CSVPoseLookup
+from spoken_to_signed.gloss_to_pose.lookup.pose_cache import PoseCache, copy_pose
+from spoken_to_signed.gloss_to_pose.smoothing import find_best_connection_point, pose_savgol_filter, \
+    smooth_concatenate_poses
+from spoken_to_signed.pose_to_video.renderer import RenderSettings, draw_frames, encode_frames
+from benchmarks.synthetic import synthetic_lexicon
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def stub_text_to_gloss(text: str):
+    # Stands in for the glossers: every word is its own gloss, no model and no network
+    return [[(word, word) for word in text.split()]]
+
+
+def stages(lexicon: str, sentence: str, directory: str):
+    """
+    name -> (prepare, run) for every stage. prepare builds fresh inputs for one run (most stages work in place)
+    and is not timed, run(*inputs) is.
+    """
+    [glosses] = stub_text_to_gloss(sentence)
+    lookup = CSVPoseLookup(lexicon)
+    looked_up = lookup.lookup_sequence(glosses, "vi", "vsl")
+    normalized = [normalize_pose(copy_pose(p)) for p in looked_up]
+    trimmed = [trim_pose(copy_pose(p), i > 0, i < len(normalized) - 1) for i, p in enumerate(normalized)]
+    concatenated = smooth_concatenate_poses([copy_pose(p) for p in trimmed])
+    # Drawn at the size of the pipeline's output, normalized poses would only cover a few pixels
+    scaled = _scale_pose(copy_pose(concatenated))
+    frames = list(draw_frames(scaled))
+    video_path = os.path.join(directory, "video.mp4")
+
+    def connection_points(poses):
+        for pose1, pose2 in zip(poses, poses[1:]):
+            find_best_connection_point(pose1, pose2)
+
+    def text_to_video(text):
+        pose = _gloss_to_pose(stub_text_to_gloss(text), lexicon, "vi", "vsl")
+        encode_frames(draw_frames(pose), pose.body.fps, video_path)
+
+    return {
+        # An empty pose cache, every entry is read and parsed from disk
+        "csv_lookup": (lambda: (CSVPoseLookup(lexicon, cache=PoseCache(max_bytes=0)),),
+                       lambda cold_lookup: cold_lookup.lookup_sequence(glosses, "vi", "vsl")),
+        "csv_lookup_cached": (lambda: (lookup,), lambda lookup: lookup.lookup_sequence(glosses, "vi", "vsl")),
+        "normalize_pose": (lambda: ([copy_pose(p) for p in looked_up],),
+                           lambda poses: [normalize_pose(p) for p in poses]),
+        "trim_pose": (lambda: ([copy_pose(p) for p in normalized],),
+                      lambda poses: [trim_pose(p, i > 0, i < len(poses) - 1) for i, p in enumerate(poses)]),
+        "find_best_connection_point": (lambda: ([copy_pose(p) for p in trimmed],), connection_points),
+        "smooth_concatenate_poses": (lambda: ([copy_pose(p) for p in trimmed],), smooth_concatenate_poses),
+        "pose_savgol_filter": (lambda: (copy_pose(concatenated),), pose_savgol_filter),
+        "draw": (lambda: (scaled,), lambda pose: list(draw_frames(pose))),
+        "encode": (lambda: (frames,), lambda frames: encode_frames(frames, scaled.body.fps, video_path)),
+        "text_to_video": (lambda: (sentence,), text_to_video),
+    }
+
+
+def time_stage(prepare, run, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        inputs = prepare()
+        # The stages report their progress on stdout, which is kept for the results
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            run(*inputs)
+            times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "repeat": repeat}
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Stages whose median is slower than the baseline by more than the tolerance (and by min_delta seconds)"""
+    slower = []
+    for name, result in results["stages"].items():
+        reference = baseline["stages"].get(name)
+        if reference is None:
+            continue
+        limit = max(reference["median"] * (1 + tolerance), reference["median"] + min_delta)
+        if result["median"] > limit:
+            slower.append(f"{name}: {result['median'] * 1000:.1f}ms, baseline {reference['median'] * 1000:.1f}ms")
+    return slower
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Time every stage of the pipeline on a synthetic lexicon")
+    args_parser.add_argument("--entries", type=int, default=50, help="Lexicon entries")
+    args_parser.add_argument("--frames", type=int, default=50, help="Frames per lexicon entry")
+    args_parser.add_argument("--face-points", type=int, default=468)
+    args_parser.add_argument("--words", type=int, default=4, help="Signs in the benchmarked sentence")
+    args_parser.add_argument("--repeat", type=int, default=3)
+    args_parser.add_argument("--stages", nargs="+", help="Only these stages")
+    args_parser.add_argument("--output", type=str, help="Write the results (JSON) to this file instead of stdout")
+    args_parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    args_parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args_parser.add_argument("--check", action="store_true", help="Exit with an error if a stage regressed")
+    args_parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, relative")
+    args_parser.add_argument("--min-delta", type=float, default=0.002, help="Allowed slowdown, in seconds")
+    args = args_parser.parse_args()
+
+    # Serial drawing, the parallel one is compared in bench_render.py
+    RenderSettings.draw_workers = 1
+
+    config = {"entries": args.entries, "frames": args.frames, "face_points": args.face_points, "words": args.words}
+    results = {
+        "config": config,
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        lexicon = os.path.join(directory, "lexicon")
+        words = synthetic_lexicon(lexicon, args.entries, args.frames, args.face_points)
+        sentence = " ".join(words[i * 7 % len(words)] for i in range(args.words))
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            all_stages = stages(lexicon, sentence, directory)
+        for name in args.stages or all_stages:
+            prepare, run = all_stages[name]
+            results["stages"][name] = time_stage(prepare, run, args.repeat)
+            print(f"{name:>28}: {results['stages'][name]['median'] * 1000:9.2f}ms", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    elif args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            sys.exit(f"Baseline config {baseline['config']} differs from {config}")
+        slower = regressions(results, baseline, args.tolerance, args.min_delta)
+        if slower:
+            sys.exit("Slower than the baseline:\n" + "\n".join(slower))
+        print("No regression", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# python benchmarks/suite.py --save-baseline
+# python benchmarks/suite.py --check --output results.json
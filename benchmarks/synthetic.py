@@ -0,0 +1,89 @@
+import csv
+import os
+from typing import List
+
+import numpy as np
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+from pose_format.pose_header import PoseHeader, PoseHeaderComponent, PoseHeaderDimensions
+
+BODY_POINTS = [
+    "NOSE", "LEFT_EYE_INNER", "LEFT_EYE", "LEFT_EYE_OUTER", "RIGHT_EYE_INNER", "RIGHT_EYE", "RIGHT_EYE_OUTER",
+    "LEFT_EAR", "RIGHT_EAR", "MOUTH_LEFT", "MOUTH_RIGHT", "LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_ELBOW",
+    "RIGHT_ELBOW", "LEFT_WRIST", "RIGHT_WRIST", "LEFT_PINKY", "RIGHT_PINKY", "LEFT_INDEX", "RIGHT_INDEX",
+    "LEFT_THUMB", "RIGHT_THUMB", "LEFT_HIP", "RIGHT_HIP", "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE",
+    "LEFT_HEEL", "RIGHT_HEEL", "LEFT_FOOT_INDEX", "RIGHT_FOOT_INDEX",
+]
+HAND_POINTS = ["WRIST"] + [f"{finger}_{joint}" for finger in ["THUMB", "INDEX_FINGER", "MIDDLE_FINGER",
+                                                                 "RING_FINGER", "PINKY"]
+                           for joint in ["1", "2", "3", "4"]]
+
+
+def _component(name: str, points, color) -> PoseHeaderComponent:
+    limbs = [(i, i + 1) for i in range(len(points) - 1)]
+    return PoseHeaderComponent(name=name, points=points, limbs=limbs, colors=[color], point_format="XYZC")
+
+
+def synthetic_holistic_header(face_points: int = 468, width: int = 512, height: int = 512) -> PoseHeader:
+    components = [
+        _component("POSE_LANDMARKS", BODY_POINTS, (255, 0, 0)),
+        _component("FACE_LANDMARKS", [str(i) for i in range(face_points)], (128, 128, 128)),
+        _component("LEFT_HAND_LANDMARKS", HAND_POINTS, (0, 255, 0)),
+        _component("RIGHT_HAND_LANDMARKS", HAND_POINTS, (0, 0, 255)),
+        _component("POSE_WORLD_LANDMARKS", BODY_POINTS, (255, 255, 0)),
+    ]
+    return PoseHeader(version=0.1, dimensions=PoseHeaderDimensions(width=width, height=height, depth=1),
+                      components=components)
+
+
+def synthetic_holistic_pose(frames: int = 50, face_points: int = 468, fps: float = 25, seed: int = 0,
+                            hands_missing: range = None) -> Pose:
+    """
+    A holistic-like pose with smooth random motion, where the wrists rise above the elbows mid-sign.
+    The hand landmarks can drop out over a range of frames, as when the detector loses them.
+    """
+    header = synthetic_holistic_header(face_points)
+    rng = np.random.default_rng(seed)
+    points = header.total_points()
+
+    base = rng.uniform(0.3, 0.7, size=(1, 1, points, 3))
+    motion = np.cumsum(rng.normal(scale=0.005, size=(frames, 1, points, 3)), axis=0)
+    data = ((base + motion) * [header.dimensions.width, header.dimensions.height, 1]).astype(np.float32)
+
+    # Shoulders apart for normalization, wrists above the elbows in the middle of the sign
+    index = {name: i for i, name in enumerate(BODY_POINTS)}
+    data[:, 0, index["LEFT_SHOULDER"], :2] = [320, 200]
+    data[:, 0, index["RIGHT_SHOULDER"], :2] = [190, 200]
+    active = np.sin(np.linspace(0, np.pi, frames)) > 0.3
+    for hand in ["LEFT", "RIGHT"]:
+        data[:, 0, index[f"{hand}_ELBOW"], 1] = 300
+        data[:, 0, index[f"{hand}_WRIST"], 1] = np.where(active, 250, 350)
+
+    confidence = np.ones((frames, 1, points), dtype=np.float32)
+    if hands_missing is not None:
+        first = len(BODY_POINTS) + face_points
+        hands = slice(first, first + 2 * len(HAND_POINTS))
+        data[hands_missing, :, hands] = 0
+        confidence[hands_missing, :, hands] = 0
+    return Pose(header, NumPyPoseBody(fps=fps, data=data, confidence=confidence))
+
+
+def synthetic_lexicon(directory: str, entries: int = 100, frames: int = 50, face_points: int = 468,
+                      spoken_language: str = "vi", signed_language: str = "vsl",
+                      hands_missing: range = None) -> List[str]:
+    """
+    A CSV lexicon of synthetic poses in the directory (index.csv + one .pose per entry), returns its words.
+    With hands_missing, every other entry loses its hands over those frames.
+    """
+    os.makedirs(os.path.join(directory, signed_language), exist_ok=True)
+    words = [f"w{i}" for i in range(entries)]
+    with open(os.path.join(directory, "index.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "spoken_language", "signed_language", "start", "end", "words", "glosses", "priority"])
+        for i, word in enumerate(words):
+            path = f"{signed_language}/{i}.pose"
+            with open(os.path.join(directory, path), "wb") as pose_file:
+                synthetic_holistic_pose(frames, face_points, seed=i,
+                                        hands_missing=hands_missing if i % 2 == 1 else None).write(pose_file)
+            writer.writerow([path, spoken_language, signed_language, 0, 0, word, word, 0])
+    return words
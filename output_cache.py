@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, Optional
+
+from spoken_to_signed.gloss_to_pose.lookup.compiled_lookup import compiled_lexicon_path
+from spoken_to_signed.gloss_to_pose.lookup.lexicon_index import lexicon_index_path
+from spoken_to_signed.pose_to_video.renderer import RenderSettings
+
+logger = logging.getLogger(__name__)
+
+# Tăng mỗi khi code tạo pose hoặc video (nối, làm mượt, vẽ...) cho ra kết quả khác, để video cũ không được dùng lại
+PIPELINE_VERSION = 3
+
+KEY_PATTERN = re.compile(r"[0-9a-f]{32}\.mp4")
+
+
+class OutputCacheSettings:
+    # Video cũ hơn max_age (giây) bị xoá, rồi các video ít được dùng nhất khi tổng dung lượng vượt max_bytes
+    max_bytes = 2 * 1024 ** 3
+    max_age = 7 * 24 * 3600
+    # Video vừa render xong hoặc vừa trả về (task đã báo completed, client sắp tải) không bị xoá trong chừng ấy giây
+    keep_recent = 30
+
+
+@lru_cache(maxsize=16)
+def _index_hash(index_path: str, mtime_ns: int) -> str:
+    with open(index_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def lexicon_version(lexicon: str) -> str:
+    index_path = os.path.join(lexicon, "index.csv")
+    version = _index_hash(index_path, os.stat(index_path).st_mtime_ns)
+    # Gói compiled và index SQLite đang dùng (nếu có): build lại thì khoá đổi. Gói có thể rất lớn, chỉ lấy
+    # kích thước và thời điểm ghi thay vì hash nội dung
+    for built_path in (compiled_lexicon_path(lexicon), lexicon_index_path(lexicon)):
+        if built_path is not None:
+            stat = os.stat(built_path)
+            version += f":{os.path.basename(built_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return version
+
+
+def render_settings() -> dict:
+    return {"output_fps": RenderSettings.output_fps, "preset": RenderSettings.preset,
+            "streaming": RenderSettings.streaming}
+
+
+def output_key(sentences, lexicon: str) -> str:
+    """Khoá theo nội dung: chuỗi gloss, phiên bản từ điển, cấu hình render và phiên bản pipeline"""
+    content = json.dumps({
+        "sentences": [[list(item) for item in sentence] for sentence in sentences],
+        "lexicon": lexicon_version(lexicon),
+        "render": render_settings(),
+        "pipeline": PIPELINE_VERSION,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class OutputCache:
+    """Video đã render, lưu theo khoá nội dung; các request trùng khoá đang render sẽ chờ chung một lần render"""
+
+    def __init__(self, directory: str = "static/videos", max_bytes: int = None, max_age: float = None):
+        self.directory = directory
+        self.max_bytes = max_bytes if max_bytes is not None else OutputCacheSettings.max_bytes
+        self.max_age = max_age if max_age is not None else OutputCacheSettings.max_age
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return f"{self.directory}/{key}.mp4"
+
+    def partial_path(self, key: str) -> str:
+        return f"{self.directory}/{key}.partial.mp4"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path(key)
+        try:
+            # Thời điểm ghi là lần dùng gần nhất, để xoá các video ít được dùng nhất trước
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get_or_create(self, key: str, create: Callable[[str], None]) -> str:
+        """create(path) ghi video vào path; trả về đường dẫn video"""
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        path = self.path(key)
+        # Ghi ra file tạm rồi đổi tên, để request khác không bao giờ thấy video dở dang
+        partial_path = self.partial_path(key)
+        try:
+            create(partial_path)
+            os.replace(partial_path, path)
+            future.set_result(path)
+            self.evict()
+            return path
+        except BaseException as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _videos(self) -> list:
+        # (thời điểm dùng, kích thước, đường dẫn) của các video đã xong, không tính file dở dang hay file khác
+        videos = []
+        for entry in os.scandir(self.directory):
+            if KEY_PATTERN.fullmatch(entry.name):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                videos.append((stat.st_mtime, stat.st_size, entry.path))
+        return videos
+
+    def evict(self) -> int:
+        """
+        Xoá video quá max_age, rồi video ít được dùng nhất đến khi tổng dung lượng dưới max_bytes.
+        Không xoá video đang render hay vừa dùng trong keep_recent giây
+        """
+        videos = sorted(self._videos())
+        total = sum(size for _, size, _ in videos)
+        now = time.time()
+        oldest = now - self.max_age
+        with self._lock:
+            in_flight = {self.path(key) for key in self._in_flight}
+        evicted = 0
+        for used_at, size, path in videos:
+            if used_at >= oldest and total <= self.max_bytes:
+                break
+            if used_at > now - OutputCacheSettings.keep_recent or path in in_flight:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info("Evicted %d videos from %s", evicted, self.directory)
+            with self._lock:
+                self.evictions += evicted
+        return evicted
+
+    def stats(self) -> dict:
+        videos = self._videos()
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(videos),
+                "bytes": sum(size for _, size, _ in videos),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """Một tầng xử lý với số worker cố định"""
+
+    def __init__(self, name: str, workers: int, handler: Callable, on_done: Callable):
+        self.name = name
+        self.workers = workers
+        self.handler = handler
+        self.on_done = on_done
+        self.active = 0
+
+        self._queue = queue.Queue()
+        self._waiting = OrderedDict()
+        self._lock = threading.Lock()
+
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True).start()
+
+    def put(self, task_id: str, payload):
+        with self._lock:
+            self._waiting[task_id] = None
+        self._queue.put((task_id, payload))
+
+    def position(self, task_id: str) -> Optional[int]:
+        with self._lock:
+            for position, waiting_id in enumerate(self._waiting, start=1):
+                if waiting_id == task_id:
+                    return position
+        return None
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def _work(self):
+        while True:
+            task_id, payload = self._queue.get()
+            with self._lock:
+                self._waiting.pop(task_id, None)
+                self.active += 1
+            try:
+                result = self.handler(task_id, payload)
+            except Exception:
+                logger.exception("%s failed for %s", self.name, task_id)
+                result = None
+            finally:
+                with self._lock:
+                    self.active -= 1
+            self.on_done(task_id, result)
+
+
+class JobScheduler:
+    """Hai tầng: gloss (chờ I/O, LLM) rồi pose + render (CPU), nhận tối đa max_queue job đang chờ"""
+
+    def __init__(self, gloss: Callable, render: Callable, gloss_workers: int, render_workers: int, max_queue: int):
+        self.max_queue = max_queue
+        self.capacity = max_queue + gloss_workers + render_workers
+        self.in_flight = 0
+        self.average_seconds = 5.0
+        self._started_at = {}
+        self._lock = threading.Lock()
+
+        self.render_stage = Stage("render", render_workers, render, self._render_done)
+        self.gloss_stage = Stage("gloss", gloss_workers, gloss, self._gloss_done)
+
+    def admit(self, task_id: str = None) -> bool:
+        """Giữ một chỗ trong giới hạn; job chạy ngoài các tầng (như /convert/pose) trả chỗ bằng release"""
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                return False
+            self.in_flight += 1
+            if task_id is not None:
+                self._started_at[task_id] = time.monotonic()
+        return True
+
+    def release(self):
+        self._finish(None)
+
+    def submit(self, task_id: str, text: str) -> bool:
+        if not self.admit(task_id):
+            return False
+        self.gloss_stage.put(task_id, text)
+        return True
+
+    def position(self, task_id: str) -> Optional[dict]:
+        for stage in [self.gloss_stage, self.render_stage]:
+            position = stage.position(task_id)
+            if position is not None:
+                return {"stage": stage.name, "queue_position": position}
+        return None
+
+    def retry_after(self) -> int:
+        # Ước lượng thời gian để một chỗ trong hàng đợi được giải phóng
+        waiting = len(self.gloss_stage) + len(self.render_stage)
+        return max(1, round(self.average_seconds * (waiting + 1) / self.render_stage.workers))
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "gloss": {"workers": self.gloss_stage.workers, "active": self.gloss_stage.active,
+                      "waiting": len(self.gloss_stage)},
+            "render": {"workers": self.render_stage.workers, "active": self.render_stage.active,
+                       "waiting": len(self.render_stage)},
+        }
+
+    def _gloss_done(self, task_id: str, result):
+        if result is None:
+            self._finish(task_id)
+        else:
+            self.render_stage.put(task_id, result)
+
+    def _render_done(self, task_id: str, result):
+        self._finish(task_id)
+
+    def _finish(self, task_id: str):
+        with self._lock:
+            self.in_flight -= 1
+            started_at = self._started_at.pop(task_id, None)
+            if started_at is not None:
+                self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.monotonic() - started_at)
@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+FINISHED = ("completed", "error")
+
+
+class StatusStore:
+    """Trạng thái các task, tự xoá task đã xong sau finished_ttl giây (và task bị bỏ dở sau stale_ttl giây)"""
+
+    def __init__(self, finished_ttl: float = 600, stale_ttl: float = 3600):
+        self.finished_ttl = finished_ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}  # task_id -> (status, version, updated_at)
+        self._pruned_at = 0.0
+        self._condition = threading.Condition()
+
+    def __setitem__(self, task_id: str, status: dict):
+        with self._condition:
+            self._set(task_id, dict(status))
+
+    def __getitem__(self, task_id: str) -> dict:
+        status = self.get(task_id)
+        if status is None:
+            raise KeyError(task_id)
+        return status
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, task_id: str, default=None) -> Optional[dict]:
+        entry = self._entries.get(task_id)
+        return dict(entry[0]) if entry is not None else default
+
+    def update(self, task_id: str, **fields):
+        with self._condition:
+            status = self._entries[task_id][0] if task_id in self._entries else {}
+            self._set(task_id, {**status, **fields})
+
+    def pop(self, task_id: str, default=None):
+        with self._condition:
+            entry = self._entries.pop(task_id, None)
+            self._condition.notify_all()
+        return entry[0] if entry is not None else default
+
+    def wait(self, task_id: str, version: int, timeout: float) -> Tuple[int, Optional[dict]]:
+        """Chờ tới khi trạng thái có version mới hơn `version` (hoặc hết timeout)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version(task_id) != version, timeout=timeout)
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return -1, None
+            return entry[1], dict(entry[0])
+
+    def _version(self, task_id: str) -> int:
+        entry = self._entries.get(task_id)
+        return entry[1] if entry is not None else -1
+
+    def _set(self, task_id: str, status: dict):
+        now = time.monotonic()
+        self._entries[task_id] = (status, self._version(task_id) + 1, now)
+        if now - self._pruned_at > 1:
+            self._prune(now)
+        self._condition.notify_all()
+
+    def _prune(self, now: float):
+        expired = [task_id for task_id, (status, _, updated_at) in self._entries.items()
+                   if now - updated_at > (self.finished_ttl if status.get("status") in FINISHED else self.stale_ttl)]
+        for task_id in expired:
+            del self._entries[task_id]
+        self._pruned_at = now
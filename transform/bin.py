@@ -1,30 +1,79 @@
 import argparse
 import importlib
+import json
+import logging
 import os
 import tempfile
-from itertools import chain
-from typing import List
+from typing import Iterator, List, Optional
 import sys
 
 from pose_format import Pose
 
 from spoken_to_signed.gloss_to_pose import gloss_to_pose, CSVPoseLookup, concatenate_poses
+from spoken_to_signed.gloss_to_pose.concatenate import stream_concatenate_poses
+from spoken_to_signed.gloss_to_pose.lookup.compiled_lookup import compiled_lexicon_path, get_compiled_pose_lookup
+from spoken_to_signed.gloss_to_pose.lookup.csv_lookup import get_csv_pose_lookup, lexicon_languages
 from spoken_to_signed.gloss_to_pose.lookup.fingerspelling_lookup import FingerspellingPoseLookup
+from spoken_to_signed.metrics import span
+from spoken_to_signed.pipeline import for_each, run_pipeline
 from spoken_to_signed.text_to_gloss.types import Gloss
 
 
 def _text_to_gloss(text: str, language: str, glosser: str, **kwargs) -> List[Gloss]:
     module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{glosser}")
-    return module.text_to_gloss(text=text, language=language, **kwargs)
+    with span("text_to_gloss", glosser=glosser):
+        return module.text_to_gloss(text=text, language=language, **kwargs)
+
+
+def _cached_text_to_gloss(text: str, language: str, glosser: str, **kwargs) -> Optional[List[Gloss]]:
+    # The glosses when the glosser has them without a remote call (from its lexicon or its cache), None otherwise
+    module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{glosser}")
+    if not hasattr(module, "cached_text_to_gloss"):
+        return None
+    return module.cached_text_to_gloss(text=text, language=language, **kwargs)
+
+
+def _text_to_gloss_batch(texts: List[str], language: str, glosser: str, **kwargs) -> List[List[Gloss]]:
+    module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{glosser}")
+    with span("text_to_gloss_batch", glosser=glosser, texts=len(texts)):
+        if hasattr(module, "text_to_gloss_batch"):
+            return module.text_to_gloss_batch(texts=texts, language=language, **kwargs)
+        return [module.text_to_gloss(text=text, language=language, **kwargs) for text in texts]
+
+
+def _get_pose_lookup(lexicon: str):
+    # Prefer the compiled (memory-mapped) lexicon when it has been built
+    pack_path = compiled_lexicon_path(lexicon)
+    if pack_path is not None:
+        return get_compiled_pose_lookup(pack_path)
+    return get_csv_pose_lookup(lexicon)
 
 
 def _gloss_to_pose(sentences: List[Gloss], lexicon: str, spoken_language: str, signed_language: str) -> Pose:
     # Không dùng fingerspelling backup
-    pose_lookup = CSVPoseLookup(lexicon)
-    poses = [gloss_to_pose(gloss, pose_lookup, spoken_language, signed_language) for gloss in sentences]
-    if len(poses) == 1:
-        return poses[0]
-    return concatenate_poses(poses, trim=False)
+    pose_lookup = _get_pose_lookup(lexicon)
+    with span("gloss_to_pose", sentences=len(sentences)):
+        poses = [gloss_to_pose(gloss, pose_lookup, spoken_language, signed_language) for gloss in sentences]
+        if len(poses) == 1:
+            return poses[0]
+        return concatenate_poses(poses, trim=False)
+
+
+def _gloss_to_pose_stream(sentences: List[Gloss], lexicon: str, spoken_language: str,
+                          signed_language: str) -> Iterator[Pose]:
+    """
+    _gloss_to_pose in segments, each sent as soon as its join is known: the signs of a sentence are trimmed and
+    joined as there, and so are the sentences, untrimmed
+    """
+    pose_lookup = _get_pose_lookup(lexicon)
+    if len(sentences) == 1:
+        with span("lookup", sentences=1):
+            poses = pose_lookup.lookup_sequence(sentences[0], spoken_language, signed_language)
+        return stream_concatenate_poses(poses)
+
+    with span("gloss_to_pose", sentences=len(sentences)):
+        poses = [gloss_to_pose(gloss, pose_lookup, spoken_language, signed_language) for gloss in sentences]
+    return stream_concatenate_poses(poses, trim=False)
 
 
 def _get_models_dir():
@@ -70,16 +119,15 @@ def _pose_to_video(pose: Pose, video_path: str):
 
 def _text_input_arguments(parser: argparse.ArgumentParser):
     parser.add_argument("--text", type=str, required=True)
-    parser.add_argument("--glosser", choices=['simple', 'spacylemma', 'rules', 'nmt'], required=True)
+    parser.add_argument("--glosser", choices=['simple', 'spacylemma', 'rules', 'nmt', 'gpt', 'trie'], required=True)
 
     pre_parser = argparse.ArgumentParser(add_help=False)
     pre_parser.add_argument("--lexicon", type=str)
     pre_args, _ = pre_parser.parse_known_args()
 
     if pre_args.lexicon:
-        lookup = CSVPoseLookup(pre_args.lexicon)
-        spoken_languages = list(lookup.words_index.keys())
-        signed_languages = set(chain.from_iterable(lookup.words_index[lang].keys() for lang in spoken_languages))
+        # Only the language columns of the index, building the lookup would read the whole lexicon
+        spoken_languages, signed_languages = lexicon_languages(pre_args.lexicon)
     else:
         spoken_languages = ['de', 'fr', 'it', 'en']
         signed_languages = ['sgg', 'gsg', 'bfi', 'ase']
@@ -133,6 +181,105 @@ def text_to_gloss_to_pose():
     print("Output pose:", args.pose)
 
 
+def _invalid_batch_id(item_id: str) -> Optional[str]:
+    # Ids name the output files, <id>.pose must stay inside the output directory
+    if item_id in ("", ".", "..") or "\0" in item_id \
+            or any(separator in item_id for separator in ("/", "\\", os.sep, os.altsep) if separator):
+        return f"Invalid id {item_id!r}, ids are used as file names"
+    return None
+
+
+def _read_batch_items(path: str):
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                item = {"id": str(item.get("id", line_number)), "text": item["text"]}
+            except (ValueError, KeyError, AttributeError) as e:
+                yield {"id": str(line_number), "text": None, "error": f"Invalid line: {e}"}
+                continue
+
+            error = _invalid_batch_id(item["id"])
+            if error is None and not (isinstance(item["text"], str) and item["text"].strip()):
+                # Failing in the glosser would fail every text of its batch
+                error = "Invalid line: expected a non-empty \"text\" string"
+            if error is None and item["id"] in seen:
+                # The first line keeps its output, a later one would overwrite it
+                error = f"Duplicate id {item['id']!r}"
+            if error is not None:
+                yield {**item, "error": error}
+                continue
+            seen.add(item["id"])
+            yield item
+
+
+def batch_translate():
+    args_parser = argparse.ArgumentParser(description="Translate every {\"id\", \"text\"} line of a JSONL file")
+    args_parser.add_argument("--input", type=str, required=True, help="JSONL file, one text per line")
+    args_parser.add_argument("--output-dir", type=str, required=True, help="Directory for <id>.pose (and <id>.mp4)")
+    args_parser.add_argument("--glosser", choices=['simple', 'spacylemma', 'rules', 'nmt', 'gpt', 'trie'],
+                             required=True)
+    args_parser.add_argument("--fallback-glosser", type=str, help="Glosser for the texts the trie glosser can't segment")
+    args_parser.add_argument("--lexicon", type=str, required=True)
+    args_parser.add_argument("--spoken-language", type=str, required=True)
+    args_parser.add_argument("--signed-language", type=str, required=True)
+    args_parser.add_argument("--video", action="store_true", help="Also render an MP4 video for every text")
+    args_parser.add_argument("--batch-size", type=int, default=16, help="Texts glossed together (one LLM request)")
+    args_parser.add_argument("--queue-size", type=int, default=8, help="Items waiting between two stages")
+    args = args_parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def gloss(items):
+        results = _text_to_gloss_batch([item["text"] for item in items], args.spoken_language, args.glosser,
+                                       signed_language=args.signed_language, lexicon=args.lexicon,
+                                       fallback_glosser=args.fallback_glosser)
+        for item, sentences in zip(items, results):
+            if sentences:
+                item["glosses"] = sentences
+            else:
+                item["error"] = "No glosses generated from input text"
+
+    def assemble_pose(item):
+        item["pose"] = _gloss_to_pose(item["glosses"], args.lexicon, args.spoken_language, args.signed_language)
+        item["pose_path"] = os.path.join(args.output_dir, f"{item['id']}.pose")
+        with open(item["pose_path"], "wb") as f:
+            item["pose"].write(f)
+
+    def render(item):
+        from spoken_to_signed.pose_to_video.renderer import render_video
+
+        item["video_path"] = render_video(item["pose"], os.path.join(args.output_dir, f"{item['id']}.mp4"))
+
+    # Glossing, pose assembly and rendering overlap, with bounded queues in between
+    stages = [(gloss, args.batch_size), (for_each(assemble_pose), 1)]
+    if args.video:
+        stages.append((for_each(render), 1))
+
+    succeeded = failed = 0
+    results_path = os.path.join(args.output_dir, "results.jsonl")
+    with open(results_path, "w", encoding="utf-8") as results:
+        for item in run_pipeline(_read_batch_items(args.input), stages, queue_size=args.queue_size):
+            result = {"id": item["id"], "status": "error" if "error" in item else "ok"}
+            for field, key in [("glosses", "glosses"), ("pose_path", "pose"), ("video_path", "video"), ("error", "error")]:
+                if field in item:
+                    result[key] = item[field]
+            results.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results.flush()
+            if "error" in item:
+                failed += 1
+            else:
+                succeeded += 1
+
+    print("Batch translate")
+    print("Input:", args.input)
+    print(f"Succeeded: {succeeded}, failed: {failed}")
+    print("Results:", results_path)
+
+
 def text_to_gloss_to_pose_to_video():
     args_parser = argparse.ArgumentParser()
     _text_input_arguments(args_parser)
@@ -158,7 +305,7 @@ from spoken_to_signed.gloss_to_pose import CSVPoseLookup, concatenate_poses
 def direct_to_pose():
     args_parser = argparse.ArgumentParser(description="Convert text to gloss to pose")
     args_parser.add_argument("--text", type=str, required=True, help="Input text to convert")
-    args_parser.add_argument("--glosser", choices=['simple', 'spacylemma', 'rules', 'nmt', 'gpt'], required=True, help="Glosser method to use")
+    args_parser.add_argument("--glosser", choices=['simple', 'spacylemma', 'rules', 'nmt', 'gpt', 'trie'], required=True, help="Glosser method to use")
     args_parser.add_argument("--lexicon", type=str, required=True, help="Path to lexicon directory")
     args_parser.add_argument("--spoken-language", choices=['vi', 'de', 'fr', 'it', 'en'], required=True, help="Spoken language")
     args_parser.add_argument("--signed-language", choices=['vsl', 'sgg', 'ssr', 'slf', 'gsg', 'bfi', 'ase'], required=True, help="Signed language")
@@ -214,12 +361,18 @@ def direct_to_pose():
 
 # Update the main execution
 if __name__ == "__main__":
+    # Timing spans and progress are logged at DEBUG level (LOG_LEVEL=DEBUG)
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING"))
     # Determine which function to run based on script name or argument
     import sys
-    if len(sys.argv) > 0 and 'text_to_gloss_to_pose' in sys.argv[0]:
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.argv.pop(1)
+        batch_translate()
+    elif len(sys.argv) > 0 and 'text_to_gloss_to_pose' in sys.argv[0]:
         direct_to_pose()
     else:
         direct_to_pose()  # Default to the new function
         
         
-# python -m spoken_to_signed.bin --text "chào tôi tên là Thành, tôi dạy ở UIT" --glosser gpt --lexicon "assets/vietnamese_lexicon" --spoken-language vi --signed-language vsl --pose output.pose
\ No newline at end of file
+# python -m spoken_to_signed.bin --text "chào tôi tên là Thành, tôi dạy ở UIT" --glosser gpt --lexicon "assets/vietnamese_lexicon" --spoken-language vi --signed-language vsl --pose output.pose
+# python -m spoken_to_signed.bin batch --input texts.jsonl --output-dir out --glosser trie --fallback-glosser gpt --lexicon "assets/vietnamese_lexicon" --spoken-language vi --signed-language vsl --video
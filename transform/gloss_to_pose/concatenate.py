@@ -1,17 +1,26 @@
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 import numpy as np
 from pose_format import Pose
 from pose_format.utils.generic import reduce_holistic, correct_wrists, pose_normalization_info, normalize_pose_size
 
-from spoken_to_signed.gloss_to_pose.smoothing import smooth_concatenate_poses
+from spoken_to_signed.gloss_to_pose.smoothing import smooth_concatenate_poses, smooth_concatenate_stream
+from spoken_to_signed.metrics import span, timed_iter
 
 class ConcatenationSettings:
     is_reduce_holistic = True
+    # Poses are read as float32, and kept so through the pipeline (half the memory of float64)
+    dtype = np.float32
 
 
 def normalize_pose(pose: Pose) -> Pose:
-    return pose.normalize(pose_normalization_info(pose.header))
+    # Poses from a compiled lexicon were already normalized offline (and are read-only views)
+    if getattr(pose, "is_normalized", False):
+        return pose
+    pose = pose.normalize(pose_normalization_info(pose.header))
+    # The normalization computes in float64
+    pose.body.data = pose.body.data.astype(ConcatenationSettings.dtype, copy=False)
+    return pose
 
 
 def get_signing_boundary(pose: Pose, wrist_index: int, elbow_index: int) -> Tuple[int, int]:
@@ -33,10 +42,7 @@ def get_signing_boundary(pose: Pose, wrist_index: int, elbow_index: int) -> Tupl
     return (max(first_non_zero_index, first_active_frame - 5),
             min(last_non_zero_index, last_active_frame + 5))
 
-def trim_pose(pose, start=True, end=True):
-    if len(pose.body.data) == 0:
-        raise ValueError("Cannot trim an empty pose")
-
+def get_pose_signing_boundary(pose: Pose) -> Tuple[int, int]:
     first_frame = len(pose.body.data)
     last_frame = 0
 
@@ -48,6 +54,21 @@ def trim_pose(pose, start=True, end=True):
         first_frame = min(first_frame, boundary_start)
         last_frame = max(last_frame, boundary_end)
 
+    return first_frame, last_frame
+
+
+def trim_pose(pose, start=True, end=True):
+    if len(pose.body.data) == 0:
+        raise ValueError("Cannot trim an empty pose")
+
+    # Compiled lexicon entries carry their boundary, computed when the lexicon was built
+    boundary = getattr(pose, "signing_boundary", None)
+    if boundary is not None:
+        first_frame, last_frame = boundary
+        pose.signing_boundary = None
+    else:
+        first_frame, last_frame = get_pose_signing_boundary(pose)
+
     if not start:
         first_frame = 0
     if not end:
@@ -55,29 +76,54 @@ def trim_pose(pose, start=True, end=True):
 
     pose.body.data = pose.body.data[first_frame:last_frame]
     pose.body.confidence = pose.body.confidence[first_frame:last_frame]
+    # Frames kept from the lexicon entry, to find its joins in the transition index
+    pose.frame_range = (first_frame, last_frame)
     return pose
 
-def concatenate_poses(poses: List[Pose], trim=True) -> Pose:
+def _normalize_and_trim(poses: List[Pose], trim: bool) -> List[Pose]:
     valid_poses = [p for p in poses if len(p.body.data) > 0]
     if not valid_poses:
         raise ValueError("No valid poses to concatenate")
-    
-    print('Normalizing poses...')
-    valid_poses = [normalize_pose(p) for p in valid_poses]
+
+    with span("normalize", poses=len(valid_poses)):
+        valid_poses = [normalize_pose(p) for p in valid_poses]
 
     if trim:
-        print('Trimming poses...')
-        valid_poses = [trim_pose(p, i > 0, i < len(valid_poses) - 1) for i, p in enumerate(valid_poses)]
+        with span("trim", poses=len(valid_poses)):
+            valid_poses = [trim_pose(p, i > 0, i < len(valid_poses) - 1) for i, p in enumerate(valid_poses)]
 
-    print('Smooth concatenating poses...')
-    pose = smooth_concatenate_poses(valid_poses)
+    return valid_poses
 
-    print('Scaling pose...')
-    normalize_pose_size(pose)
 
+def _scale_pose(pose: Pose) -> Pose:
+    if getattr(pose, "is_normalized", False):
+        # A single compiled entry is returned as is by the smoothing, and is about to be rescaled
+        pose.is_normalized = False
+    with span("scale"):
+        normalize_pose_size(pose)
+        # Masked arrays scaled by a Python float turn into float64
+        pose.body.data = pose.body.data.astype(ConcatenationSettings.dtype, copy=False)
     return pose
 
 
+def stream_concatenate_poses(poses: List[Pose], trim=True) -> Iterator[Pose]:
+    """concatenate_poses, yielding the pose in segments as soon as each join is known"""
+    valid_poses = _normalize_and_trim(poses, trim)
+
+    for segment in timed_iter(smooth_concatenate_stream(valid_poses), "smooth_concatenate_stream"):
+        # Scaling is per frame, so each segment is scaled on its own
+        yield _scale_pose(segment)
+
+
+def concatenate_poses(poses: List[Pose], trim=True) -> Pose:
+    valid_poses = _normalize_and_trim(poses, trim)
+
+    with span("smooth_concatenate", poses=len(valid_poses)):
+        pose = smooth_concatenate_poses(valid_poses)
+
+    return _scale_pose(pose)
+
+
 # def concatenate_poses(poses: List[Pose], trim=True) -> Pose:
     if ConcatenationSettings.is_reduce_holistic:
         print('Reducing poses...')
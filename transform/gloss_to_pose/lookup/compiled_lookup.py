@@ -0,0 +1,235 @@
+import argparse
+import io
+import json
+import os
+import struct
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+from pose_format.pose_header import PoseHeader
+from pose_format.utils.reader import BufferReader
+
+from spoken_to_signed.gloss_to_pose.concatenate import normalize_pose, get_pose_signing_boundary
+from spoken_to_signed.gloss_to_pose.transitions import TransitionIndex, TransitionSettings, compute_transitions, \
+    transition_points, transition_vectors, window_size
+from .csv_lookup import CSVPoseLookup
+from .lexicon_index import get_lexicon_index, lexicon_index_path, use_lexicon_index
+from .lookup import PoseLookup
+from .pose_cache import PoseCache, copy_header
+
+# Pack layout: MAGIC, uint64 metadata offset, uint64 metadata length, then 64 byte aligned blocks
+# (pose headers, float32 or float16 data, float32 confidence, optional int16 transition table)
+# and finally the JSON metadata with the offset table.
+MAGIC = b"VSLPACK1"
+PREFIX = struct.Struct("<8sQQ")
+ALIGNMENT = 64
+PACK_FILENAME = "index.pack"
+# float16 halves the pack (and the pages it keeps in memory), poses are read back as float32
+DATA_DTYPES = ("float32", "float16")
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % ALIGNMENT))
+    return f.tell()
+
+
+def compile_lexicon(directory: str, output_path: str = None, dtype: str = "float32") -> str:
+    """Normalize every lexicon entry once and write them into a single memory-mappable pack"""
+    if dtype not in DATA_DTYPES:
+        raise ValueError(f"Unsupported pack dtype {dtype}, expected one of {DATA_DTYPES}")
+    if output_path is None:
+        output_path = os.path.join(directory, PACK_FILENAME)
+
+    # Every pose is read exactly once, no need to cache them
+    lookup = CSVPoseLookup(directory, cache=PoseCache(max_bytes=0))
+    if len(lookup.rows) == 0:
+        raise ValueError(f"Lexicon {directory} has no entries")
+
+    headers = []
+    header_indexes = {}
+    entries = []
+    data = []
+    confidence = []
+    tails = []
+    heads = []
+    frame_offset = 0
+    for row in lookup.rows:
+        pose = lookup.get_pose({**row, "start": int(row["start"]), "end": int(row["end"])})
+        pose = normalize_pose(pose)
+
+        header_buffer = io.BytesIO()
+        pose.header.write(header_buffer)
+        header_bytes = header_buffer.getvalue()
+        if header_bytes not in header_indexes:
+            header_indexes[header_bytes] = len(headers)
+            headers.append(header_bytes)
+
+        pose_data = pose.body.data.filled(0).astype(np.float32)
+        if data and pose_data.shape[1:] != data[0].shape[1:]:
+            raise ValueError(f"Pose {row['path']} has shape {pose_data.shape[1:]}, "
+                             f"expected {data[0].shape[1:]} like the rest of the lexicon")
+
+        frames = len(pose_data)
+        boundary = [int(i) for i in get_pose_signing_boundary(pose)] if frames > 0 else [0, 0]
+        # Tail and head windows of the trimmed entry, the frames its joins are chosen from
+        transition_window = window_size(boundary[1] - boundary[0], pose.body.fps)
+        points = transition_points(pose.header)
+        tails.append(transition_vectors(pose_data[boundary[1] - transition_window:boundary[1]], points))
+        heads.append(transition_vectors(pose_data[boundary[0]:boundary[0] + transition_window], points))
+
+        entries.append({
+            **row,
+            "header": header_indexes[header_bytes],
+            "fps": float(pose.body.fps),
+            "frame_offset": frame_offset,
+            "frames": frames,
+            "signing_boundary": boundary,
+            "transition_window": transition_window,
+        })
+        data.append(pose_data)
+        confidence.append(np.asarray(pose.body.confidence, dtype=np.float32))
+        frame_offset += frames
+
+    _, people, points, dims = data[0].shape
+    with open(output_path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, 0, 0))
+
+        header_offsets = []
+        for header_bytes in headers:
+            header_offsets.append({"offset": _pad(f), "length": len(header_bytes)})
+            f.write(header_bytes)
+
+        data_offset = _pad(f)
+        for pose_data in data:
+            f.write(pose_data.astype(dtype, copy=False).tobytes())
+
+        confidence_offset = _pad(f)
+        for pose_confidence in confidence:
+            f.write(pose_confidence.tobytes())
+
+        # Every ordered pair of entries, unless the lexicon is too large (joins are then computed on demand)
+        transitions_offset = None
+        if len(entries) <= TransitionSettings.max_precomputed_entries:
+            transitions_offset = _pad(f)
+            f.write(compute_transitions(tails, heads).tobytes())
+
+        meta = {
+            "shape": [frame_offset, people, points, dims],
+            "dtype": dtype,
+            "headers": header_offsets,
+            "data_offset": data_offset,
+            "confidence_offset": confidence_offset,
+            "transitions_offset": transitions_offset,
+            "entries": entries,
+        }
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        meta_offset = _pad(f)
+        f.write(meta_bytes)
+
+        f.seek(0)
+        f.write(PREFIX.pack(MAGIC, meta_offset, len(meta_bytes)))
+
+    return output_path
+
+
+class CompiledPoseLookup(PoseLookup):
+    def __init__(self, pack_path: str, backup: PoseLookup = None):
+        with open(pack_path, "rb") as f:
+            magic, meta_offset, meta_length = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{pack_path} is not a compiled lexicon")
+            f.seek(meta_offset)
+            meta = json.loads(f.read(meta_length).decode("utf-8"))
+
+            self.headers = []
+            for header in meta["headers"]:
+                f.seek(header["offset"])
+                self.headers.append(PoseHeader.read(BufferReader(f.read(header["length"]))))
+
+        directory = os.path.dirname(pack_path)
+        index_path = lexicon_index_path(directory)
+        if index_path is not None:
+            # Terms are looked up in the lexicon index, rather than in dictionaries of every entry
+            super().__init__(rows=[], directory=directory, backup=backup)
+            use_lexicon_index(self, get_lexicon_index(index_path))
+        else:
+            super().__init__(rows=meta["entries"], directory=directory, backup=backup)
+
+        # Read-only mappings: the pages are shared by every process using the same pack
+        shape = tuple(meta["shape"])
+        self.data = np.memmap(pack_path, dtype=meta.get("dtype", "float32"), mode="r", offset=meta["data_offset"],
+                              shape=shape)
+        self.confidence = np.memmap(pack_path, dtype=np.float32, mode="r",
+                                    offset=meta["confidence_offset"], shape=shape[:-1])
+
+        entries = meta["entries"]
+        self.entries = {(e["path"], int(e["start"]), int(e["end"])): (i, e) for i, e in enumerate(entries)}
+
+        cuts = None
+        if meta.get("transitions_offset") is not None:
+            cuts = np.memmap(pack_path, dtype=np.int16, mode="r", offset=meta["transitions_offset"],
+                             shape=(len(entries), len(entries), 2))
+        self.transitions = TransitionIndex(cuts=cuts,
+                                           boundaries=[e["signing_boundary"] for e in entries],
+                                           windows=[e.get("transition_window") for e in entries])
+        self.lookups = 0
+
+    def get_pose(self, row) -> Pose:
+        index, entry = self.entries[(row["path"], int(row["start"]), int(row["end"]))]
+        frames = slice(entry["frame_offset"], entry["frame_offset"] + entry["frames"])
+
+        # Views into the mapping, only the mask is allocated (by NumPyPoseBody, from the confidence)
+        data = self.data[frames]
+        if data.dtype != np.float32:
+            # A float16 pack, the entry is converted (into a copy) for the rest of the pipeline
+            data = data.astype(np.float32)
+        body = NumPyPoseBody(fps=entry["fps"], data=data, confidence=self.confidence[frames])
+
+        pose = Pose(copy_header(self.headers[entry["header"]]), body)
+        pose.is_normalized = True
+        pose.signing_boundary = tuple(entry["signing_boundary"])
+        pose.lexicon_entry = index
+        pose.transitions = self.transitions
+        self.lookups += 1
+        return pose
+
+    def stats(self) -> dict:
+        # Every entry is served from the mapped pack: no file is read, so there is nothing to miss
+        return {"lookup": "compiled", "entries": len(self.entries),
+                "bytes": self.data.nbytes + self.confidence.nbytes, "hits": self.lookups, "misses": 0}
+
+
+def compiled_lexicon_path(lexicon: str) -> Optional[str]:
+    if os.path.isfile(lexicon):
+        return lexicon
+
+    pack_path = os.path.join(lexicon, PACK_FILENAME)
+    index_path = os.path.join(lexicon, "index.csv")
+    # A pack older than the index is stale, fall back to the CSV lexicon
+    if os.path.isfile(pack_path) and os.path.getmtime(pack_path) >= os.path.getmtime(index_path):
+        return pack_path
+    return None
+
+
+@lru_cache(maxsize=None)
+def _shared_compiled_pose_lookup(pack_path: str) -> CompiledPoseLookup:
+    return CompiledPoseLookup(pack_path)
+
+
+def get_compiled_pose_lookup(pack_path: str) -> CompiledPoseLookup:
+    return _shared_compiled_pose_lookup(os.path.realpath(pack_path))
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser(description="Compile a lexicon directory into a memory-mapped pose pack")
+    args_parser.add_argument("--lexicon", type=str, required=True, help="Path to lexicon directory")
+    args_parser.add_argument("--output", type=str, help=f"Output pack path (default: <lexicon>/{PACK_FILENAME})")
+    args_parser.add_argument("--dtype", choices=DATA_DTYPES, default="float32", help="Storage type of the poses")
+    args = args_parser.parse_args()
+
+    print(f"Compiled lexicon: {compile_lexicon(args.lexicon, args.output, args.dtype)}")
+
+# python -m spoken_to_signed.gloss_to_pose.lookup.compiled_lookup --lexicon assets/vietnamese_lexicon
@@ -1,15 +1,97 @@
 import csv
 import os
+from functools import lru_cache
+from typing import List, Tuple
 
+from pose_format import Pose
+
+from spoken_to_signed.gloss_to_pose.transitions import TransitionIndex
+from spoken_to_signed.metrics import span
+from .lexicon_index import get_lexicon_index, lexicon_index_path, use_lexicon_index
 from .lookup import PoseLookup
+from .pose_cache import PoseCache, copy_pose
 
 
 class CSVPoseLookup(PoseLookup):
-    def __init__(self, directory: str, backup: PoseLookup = None):
+    def __init__(self, directory: str, backup: PoseLookup = None, cache: PoseCache = None):
         if not os.path.exists(directory):
             raise ValueError(f"Directory {directory} does not exist")
 
-        with open(os.path.join(directory, 'index.csv'), mode='r', encoding='utf-8') as f:
-            rows = list(csv.DictReader(f))
+        index_path = lexicon_index_path(directory)
+        if index_path is not None:
+            # Built index (see lexicon_index.py): rows are read when looked up, none are held in memory
+            self.index = get_lexicon_index(index_path)
+            super().__init__(rows=[], directory=directory, backup=backup)
+            use_lexicon_index(self, self.index)
+            rows = self.index
+        else:
+            self.index = None
+            with open(os.path.join(directory, 'index.csv'), mode='r', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            super().__init__(rows=rows, directory=directory, backup=backup)
+
+        self.rows = rows
+        self.cache = cache if cache is not None else PoseCache()
+        self.transitions = TransitionIndex()
+
+    def read_pose(self, pose_path: str) -> Pose:
+        # The cache hands out copies, so callers are free to modify the returned pose
+        pose = self.cache.get(pose_path)
+        if pose is None:
+            with span("pose_read"):
+                pose = super().read_pose(pose_path)
+            if self.cache.set(pose_path, pose):
+                pose = copy_pose(pose)
+        return pose
+
+    def get_pose(self, row) -> Pose:
+        pose = super().get_pose(row)
+        # Joins between the same entries are computed once, see TransitionIndex
+        pose.lexicon_entry = (row["path"], int(row["start"]), int(row["end"]))
+        pose.transitions = self.transitions
+        return pose
+
+    def stats(self) -> dict:
+        """The pose cache, and whether the terms are looked up in the built index (sqlite) or the CSV rows"""
+        return {"lookup": "csv" if self.index is None else "sqlite", **self.cache.stats()}
+
+    def preload(self) -> int:
+        # Warm the cache with the lexicon poses until the byte budget is reached
+        loaded = 0
+        for path in dict.fromkeys(row['path'] for row in self.rows):
+            if self.cache.is_full:
+                break
+            if path not in self.cache:
+                self.cache.set(path, super().read_pose(path))
+                loaded += 1
+        return loaded
+
+
+def lexicon_languages(directory: str) -> Tuple[List[str], List[str]]:
+    """Spoken and signed languages of a lexicon, from its index only (no lookup indexes are built)"""
+    index_path = lexicon_index_path(directory)
+    if index_path is not None:
+        languages = get_lexicon_index(index_path).languages
+        return list(languages), list(dict.fromkeys(signed for pairs in languages.values() for signed in pairs))
+
+    spoken_languages = {}
+    signed_languages = {}
+    with open(os.path.join(directory, 'index.csv'), mode='r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        spoken_column = header.index('spoken_language')
+        signed_column = header.index('signed_language')
+        for row in reader:
+            spoken_languages[row[spoken_column]] = None
+            signed_languages[row[signed_column]] = None
+    return list(spoken_languages), list(signed_languages)
+
+
+@lru_cache(maxsize=None)
+def _shared_csv_pose_lookup(directory: str) -> CSVPoseLookup:
+    return CSVPoseLookup(directory)
+
 
-        super().__init__(rows=rows, directory=directory, backup=backup)
+def get_csv_pose_lookup(directory: str) -> CSVPoseLookup:
+    # One lookup (and pose cache) per lexicon directory for the whole process
+    return _shared_csv_pose_lookup(os.path.realpath(directory))
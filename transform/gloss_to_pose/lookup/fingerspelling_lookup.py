@@ -3,6 +3,13 @@ from pathlib import Path
 from pose_format import Pose
 
 from .. import CSVPoseLookup, concatenate_poses
+from .pose_cache import PoseCache, copy_pose
+
+END = None  # Marks the end of an alphabet key in the trie
+
+
+class FingerspellingSettings:
+    spelled_words_max_bytes = 64 * 1024 * 1024
 
 
 class FingerspellingPoseLookup(CSVPoseLookup):
@@ -14,29 +21,49 @@ class FingerspellingPoseLookup(CSVPoseLookup):
         
         self.alphabets = {
             spoken_language: {
-                signed_language: sorted(si_values.keys(), key=len, reverse=True)
+                signed_language: self.make_alphabet_trie(si_values.keys())
                 for signed_language, si_values in sp_values.items()
             }
             for spoken_language, sp_values in self.words_index.items()
         }
 
+        # Spelled words are assembled once, then served from this cache
+        self.spelled_words = PoseCache(max_bytes=FingerspellingSettings.spelled_words_max_bytes)
+
+    @staticmethod
+    def make_alphabet_trie(keys) -> dict:
+        trie = {}
+        for key in keys:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[END] = key
+        return trie
+
+    def tokenize(self, word: str, spoken_language: str, signed_language: str):
+        # Greedy longest match, left to right: linear in the word length for a fixed alphabet
+        alphabet = self.alphabets[spoken_language][signed_language]
+        i = 0
+        while i < len(word):
+            node = alphabet
+            match = None
+            j = i
+            while j < len(word) and word[j] in node:
+                node = node[word[j]]
+                j += 1
+                if END in node:
+                    match = (j, node[END])
+
+            if match is None:
+                raise FileNotFoundError(f"Characters {word[i:]} not found in fingerspelling lexicon")
+
+            i, key = match
+            yield key
+
     def characters_lookup(self, word: str, spoken_language: str, signed_language: str):
-        if word != "":
-            rows = self.words_index[spoken_language][signed_language]
-            alphabet = self.alphabets[spoken_language][signed_language]
-            found = False
-            for key in alphabet:
-                if key in word:
-                    found = True
-                    match_index = word.index(key)
-
-                    yield from self.characters_lookup(word[:match_index], spoken_language, signed_language)
-                    yield self.get_pose(rows[key][0])
-                    yield from self.characters_lookup(word[match_index + len(key):], spoken_language, signed_language)
-                    break
-
-            if not found:
-                raise FileNotFoundError(f"Characters {word} not found in fingerspelling lexicon")
+        rows = self.words_index[spoken_language][signed_language]
+        for key in list(self.tokenize(word, spoken_language, signed_language)):
+            yield self.get_pose(rows[key][0])
 
     def stretch_pose(self, pose: Pose, by: float) -> Pose:
         fps = pose.body.fps
@@ -49,9 +76,18 @@ class FingerspellingPoseLookup(CSVPoseLookup):
             raise FileNotFoundError(
                 f"Language pair {spoken_language} -> {signed_language} not supported for fingerspelling")
 
-        poses = list(self.characters_lookup(word.lower(), spoken_language, signed_language))
+        word = word.lower()
+        cache_key = f"{spoken_language}/{signed_language}/{word}"
+        pose = self.spelled_words.get(cache_key)
+        if pose is not None:
+            return pose
+
+        poses = list(self.characters_lookup(word, spoken_language, signed_language))
 
         
         poses[-1] = self.stretch_pose(poses[-1], 2)
 
-        return concatenate_poses(poses)
+        pose = concatenate_poses(poses)
+        if self.spelled_words.set(cache_key, pose):
+            pose = copy_pose(pose)
+        return pose
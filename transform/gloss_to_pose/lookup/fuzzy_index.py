@@ -0,0 +1,148 @@
+import unicodedata
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from spoken_to_signed.text_normalization import fold, trigrams
+
+DIACRITIC_COST = 0.25  # "toi" for "tôi" is a much closer miss than "tai"
+
+
+class FuzzySettings:
+    # A match is accepted within max_distance edits, and within max_ratio edits per character of the term
+    # (a three letter word only tolerates wrong diacritics, a four letter word one typo)
+    max_distance = 2.0
+    max_ratio = 0.25
+    limit = 5
+    # Candidates that share the most trigrams with the term are the only ones whose distance is computed
+    max_candidates = 64
+
+
+def _distance(a: str, folded_a: str, b: str, folded_b: str, limit: float) -> float:
+    infinity = float("inf")
+    # Every step off the diagonal is an insertion or a deletion, a path within the limit stays in this band
+    band = int(min(limit, len(a) + len(b)))
+    if abs(len(a) - len(b)) > band:
+        return infinity
+    previous = [j if j <= band else infinity for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= band else infinity] + [infinity] * len(b)
+        lowest = current[0]
+        char_a, fold_a = a[i - 1], folded_a[i - 1]
+        for j in range(max(1, i - band), min(len(b), i + band) + 1):
+            cost = previous[j - 1]
+            if char_a != b[j - 1]:
+                cost += DIACRITIC_COST if fold_a == folded_b[j - 1] else 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            current[j] = cost
+            if cost < lowest:
+                lowest = cost
+        if lowest > limit:
+            return infinity
+        previous = current
+    return previous[-1]
+
+
+def distance(a: str, b: str, limit: float = float("inf")) -> float:
+    """Levenshtein distance where a diacritic-only substitution costs DIACRITIC_COST, inf once above the limit"""
+    return _distance(a, fold(a), b, fold(b), limit)
+
+
+class FuzzyIndex:
+    """
+    Nearest lexicon terms of a word that is not in the lexicon, ignoring diacritics and a few typos.
+    Trigrams of the folded terms (inverted index) give the candidates, only those are compared to the word.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        # By length: the terms of a few lengths around the word's are a range of ids, and of every posting list
+        terms = set(unicodedata.normalize("NFC", term).lower() for term in terms)
+        self.terms = sorted(terms, key=lambda term: (len(term), term))
+        self.folded = [fold(term) for term in self.terms]
+        self.lengths = np.array([len(term) for term in self.terms], dtype=np.int32)
+
+        # Words typed without diacritics are found directly
+        self.by_folded = defaultdict(list)
+        postings = defaultdict(list)
+        for i, folded in enumerate(self.folded):
+            self.by_folded[folded].append(i)
+            for gram in trigrams(folded):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Letter counts of every folded term, the last column counts the letters of no term
+        self.alphabet = {char: i for i, char in enumerate(sorted(set("".join(self.folded))))}
+        self.letters = np.zeros((len(self.terms), len(self.alphabet) + 1), dtype=np.uint8)
+        for i, folded in enumerate(self.folded):
+            self.letters[i] = self.letter_counts(folded)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def letter_counts(self, folded: str) -> np.ndarray:
+        counts = np.zeros(len(self.alphabet) + 1, dtype=np.int16)
+        for char in folded:
+            counts[self.alphabet.get(char, len(self.alphabet))] += 1
+        return counts
+
+    def max_distance(self, term: str) -> float:
+        return min(FuzzySettings.max_distance, FuzzySettings.max_ratio * len(term))
+
+    def search(self, term: str, limit: int = None) -> List[Tuple[str, float]]:
+        """Closest terms within the accepted distance, with their distance, closest first"""
+        limit = FuzzySettings.limit if limit is None else limit
+        term = unicodedata.normalize("NFC", term).lower()
+        folded = fold(term)
+        max_distance = self.max_distance(term)
+
+        matches = []
+
+        def verify(candidate: int, bound: float):
+            nonlocal matches
+            candidate_distance = _distance(term, folded, self.terms[candidate], self.folded[candidate], bound)
+            if candidate_distance <= bound:
+                matches = sorted(matches + [(candidate_distance, self.terms[candidate])])[:limit]
+
+        for candidate in self.by_folded.get(folded, []):
+            verify(candidate, max_distance)
+        # Any other term is at least one edit away
+        if len(matches) == limit and matches[-1][0] < 1:
+            return [(match, match_distance) for match_distance, match in matches]
+
+        # Diacritics aside, an edit changes at most three trigrams of the term. Repeated syllables share trigrams,
+        # a short or repetitive term may have none left to require: then every term of a close length is a candidate
+        edits = int(max_distance)
+        grams = trigrams(folded)
+        min_shared = max(len(grams) - 3 * edits, 0)
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if len(postings) >= min_shared:
+            first, last = np.searchsorted(self.lengths, [len(term) - edits, len(term) + edits + 1])
+            postings = [ids[slice(*ids.searchsorted([first, last]))] for ids in postings]
+            shared = np.bincount(np.concatenate(postings + [np.zeros(0, dtype=np.int32)]) - first,
+                                 minlength=last - first)
+            candidates = np.flatnonzero(shared >= min_shared)
+            shared = shared[candidates]
+            candidates += first
+            # Already compared above
+            kept = np.isin(candidates, self.by_folded.get(folded, []), invert=True)
+            candidates, shared = candidates[kept], shared[kept]
+
+            # Letters in one and not the other: a lower bound of the distance, cheap for all candidates at once
+            difference = self.letters[candidates].astype(np.int16) - self.letter_counts(folded)
+            lower_bounds = np.maximum(np.maximum(difference, 0).sum(axis=1), np.maximum(-difference, 0).sum(axis=1))
+            order = np.lexsort((-shared, lower_bounds))[:FuzzySettings.max_candidates]
+            for candidate, lower_bound in zip(candidates[order], lower_bounds[order]):
+                bound = matches[-1][0] if len(matches) == limit else max_distance
+                if lower_bound > bound:
+                    break
+                verify(candidate, bound)
+
+        return [(match, match_distance) for match_distance, match in matches]
+
+    def closest(self, term: str) -> Optional[str]:
+        matches = self.search(term, limit=1)
+        return matches[0][0] if matches else None
@@ -0,0 +1,240 @@
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+INDEX_FILENAME = "index.sqlite"
+KINDS = {"words": 0, "glosses": 1}
+
+SCHEMA = """
+CREATE TABLE languages (id INTEGER PRIMARY KEY, spoken_language TEXT NOT NULL, signed_language TEXT NOT NULL,
+                        UNIQUE (spoken_language, signed_language));
+CREATE TABLE paths (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE entries (id INTEGER PRIMARY KEY, language INTEGER NOT NULL, path INTEGER NOT NULL,
+                      start INTEGER NOT NULL, end INTEGER NOT NULL, words TEXT NOT NULL, glosses TEXT NOT NULL,
+                      priority INTEGER NOT NULL);
+-- Every entry under its normalized words and glosses, in priority (then index.csv) order
+CREATE TABLE terms (language INTEGER NOT NULL, kind INTEGER NOT NULL, term TEXT NOT NULL, priority INTEGER NOT NULL,
+                    entry INTEGER NOT NULL, PRIMARY KEY (language, kind, term, priority, entry)) WITHOUT ROWID;
+"""
+
+
+def normalize_term(term: str) -> str:
+    # NFC so that decomposed input ("a" + combining grave) matches the lexicon ("à")
+    return unicodedata.normalize("NFC", term).lower()
+
+
+def build_lexicon_index(directory: str, output_path: str = None) -> str:
+    """Write index.csv into a SQLite index, read on demand by CSVPoseLookup instead of the CSV rows"""
+    if output_path is None:
+        output_path = os.path.join(directory, INDEX_FILENAME)
+
+    # Built aside and moved into place, readers never see a partial index
+    temporary_path = f"{output_path}.{os.getpid()}.tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    try:
+        # Nothing to recover if the build fails half way, the temporary file is rebuilt from scratch
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        languages = {}
+        paths = {}
+        entries = []
+        terms = []
+
+        def flush():
+            connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entries)
+            connection.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?, ?, ?, ?)", terms)
+            entries.clear()
+            terms.clear()
+
+        with open(os.path.join(directory, 'index.csv'), mode='r', encoding='utf-8') as f:
+            for entry, row in enumerate(csv.DictReader(f), start=1):
+                language = languages.setdefault((row['spoken_language'], row['signed_language']), len(languages) + 1)
+                path = paths.setdefault(row['path'], len(paths) + 1)
+                priority = int(row['priority'])
+                entries.append((entry, language, path, int(row['start']), int(row['end']), row['words'],
+                                row['glosses'], priority))
+                terms += [(language, kind, normalize_term(row[based_on]), priority, entry)
+                          for based_on, kind in KINDS.items()]
+                if len(entries) == 10000:
+                    flush()
+        flush()
+
+        connection.executemany("INSERT INTO languages VALUES (?, ?, ?)",
+                               [(language, *key) for key, language in languages.items()])
+        connection.executemany("INSERT INTO paths VALUES (?, ?)", [(path, key) for key, path in paths.items()])
+        connection.commit()
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    os.replace(temporary_path, output_path)
+    return output_path
+
+
+def lexicon_index_path(directory: str) -> Optional[str]:
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    csv_path = os.path.join(directory, 'index.csv')
+    # An index older than index.csv is stale, the CSV is read instead
+    if os.path.isfile(index_path) and os.path.isfile(csv_path) \
+            and os.path.getmtime(index_path) >= os.path.getmtime(csv_path):
+        return index_path
+    return None
+
+
+class LexiconIndex:
+    """
+    Read-only view of a built lexicon index. Opening it costs the same whatever the lexicon size,
+    rows are only read (and turned into dicts) when they are looked up.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Lookups check a term then fetch it, and sentences repeat the same few words
+        self.find = lru_cache(maxsize=4096)(self._find)
+
+        self.languages = {}
+        for language, spoken_language, signed_language in self._query(
+                "SELECT id, spoken_language, signed_language FROM languages ORDER BY id"):
+            self.languages.setdefault(spoken_language, {})[signed_language] = language
+
+    def _query(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM entries")[0][0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Every row, in index.csv order and with its columns"""
+        last = 0
+        while True:
+            # In pages, so that the lock is not held while the caller works on the rows
+            rows = self._query("""
+                SELECT e.id, p.path, l.spoken_language, l.signed_language, e.start, e.end, e.words, e.glosses,
+                       e.priority
+                FROM entries e JOIN paths p ON p.id = e.path JOIN languages l ON l.id = e.language
+                WHERE e.id > ? ORDER BY e.id LIMIT 1000
+            """, (last,))
+            if not rows:
+                return
+            for last, path, spoken_language, signed_language, start, end, words, glosses, priority in rows:
+                yield {"path": path, "spoken_language": spoken_language, "signed_language": signed_language,
+                       "start": start, "end": end, "words": words, "glosses": glosses, "priority": priority}
+
+    def entries(self, spoken_language: str, signed_language: str) -> List[Dict]:
+        """(words, glosses) of a language pair, in priority order"""
+        language = self.languages.get(spoken_language, {}).get(signed_language)
+        rows = self._query("SELECT words, glosses FROM entries WHERE language = ? ORDER BY priority, id",
+                           (language,))
+        return [{"words": words, "glosses": glosses} for words, glosses in rows]
+
+    def terms(self, language: int, kind: int) -> List[str]:
+        return [term for term, in self._query("SELECT DISTINCT term FROM terms WHERE language = ? AND kind = ?",
+                                               (language, kind))]
+
+    def contains(self, language: int, kind: int, term: str) -> bool:
+        return len(self.find(language, kind, normalize_term(term))) > 0
+
+    def _find(self, language: int, kind: int, term: str) -> List[Dict]:
+        """Rows of a term, in the format of PoseLookup's dictionary index, best priority first"""
+        rows = self._query("""
+            SELECT p.path, e.words, e.start, e.end, e.priority
+            FROM terms t JOIN entries e ON e.id = t.entry JOIN paths p ON p.id = e.path
+            WHERE t.language = ? AND t.kind = ? AND t.term = ?
+            ORDER BY t.priority, t.entry
+        """, (language, kind, term))
+        return [{"path": path, "words": words, "start": start, "end": end, "priority": priority}
+                for path, words, start, end, priority in rows]
+
+    def dictionary_index(self, based_on: str) -> "LanguagesView":
+        """Stands in for PoseLookup.words_index (or glosses_index): spoken language -> signed language -> term"""
+        return LanguagesView(self, KINDS[based_on])
+
+    def close(self):
+        self._connection.close()
+
+
+class LanguagesView(Mapping):
+    def __init__(self, index: LexiconIndex, kind: int, spoken_language: str = None):
+        self.index = index
+        self.kind = kind
+        self.spoken_language = spoken_language
+
+    def _languages(self) -> dict:
+        if self.spoken_language is None:
+            return self.index.languages
+        return self.index.languages.get(self.spoken_language, {})
+
+    def __getitem__(self, language: str):
+        if language not in self._languages():
+            raise KeyError(language)
+        if self.spoken_language is None:
+            return LanguagesView(self.index, self.kind, language)
+        return TermsView(self.index, self.kind, self._languages()[language])
+
+    def __iter__(self):
+        return iter(self._languages())
+
+    def __len__(self) -> int:
+        return len(self._languages())
+
+
+class TermsView(Mapping):
+    def __init__(self, index: LexiconIndex, kind: int, language: int):
+        self.index = index
+        self.kind = kind
+        self.language = language
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self.index.contains(self.language, self.kind, term)
+
+    def __getitem__(self, term: str) -> List[Dict]:
+        rows = self.index.find(self.language, self.kind, normalize_term(term))
+        if not rows:
+            raise KeyError(term)
+        return rows
+
+    def __iter__(self):
+        return iter(self.index.terms(self.language, self.kind))
+
+    def __len__(self) -> int:
+        return len(self.index.terms(self.language, self.kind))
+
+
+def use_lexicon_index(lookup, index: LexiconIndex):
+    """Have a PoseLookup (built without rows) look its terms up in the index"""
+    lookup.words_index = index.dictionary_index("words")
+    lookup.glosses_index = index.dictionary_index("glosses")
+
+
+@lru_cache(maxsize=None)
+def _shared_lexicon_index(path: str, mtime: float) -> LexiconIndex:
+    return LexiconIndex(path)
+
+
+def get_lexicon_index(path: str) -> LexiconIndex:
+    # One connection per index for the whole process, reopened when the index is rebuilt
+    path = os.path.realpath(path)
+    return _shared_lexicon_index(path, os.path.getmtime(path))
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser(description="Build the SQLite index of a lexicon directory")
+    args_parser.add_argument("--lexicon", type=str, required=True, help="Path to lexicon directory")
+    args_parser.add_argument("--output", type=str, help=f"Output index path (default: <lexicon>/{INDEX_FILENAME})")
+    args = args_parser.parse_args()
+
+    print(f"Lexicon index: {build_lexicon_index(args.lexicon, args.output)}")
+
+# python -m spoken_to_signed.gloss_to_pose.lookup.lexicon_index --lexicon assets/vietnamese_lexicon
@@ -0,0 +1,106 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+from pose_format.pose_header import PoseHeader
+
+
+class PoseCacheSettings:
+    max_bytes = 256 * 1024 * 1024
+
+
+def pose_nbytes(pose: Pose) -> int:
+    data = pose.body.data
+    mask = np.ma.getmask(data)
+    mask_bytes = mask.nbytes if mask is not np.ma.nomask else 0
+    return data.nbytes + mask_bytes + pose.body.confidence.nbytes
+
+
+def copy_header(header: PoseHeader) -> PoseHeader:
+    # normalize_pose_size overwrites the header dimensions, the components are never modified
+    header = copy.copy(header)
+    header.dimensions = copy.copy(header.dimensions)
+    return header
+
+
+def copy_pose(pose: Pose) -> Pose:
+    # Downstream code (normalize_pose, trim_pose, normalize_pose_size...) modifies poses in place,
+    # so every consumer gets its own body and header dimensions
+    header = copy_header(pose.header)
+    body = NumPyPoseBody(fps=pose.body.fps,
+                         data=pose.body.data.copy(),
+                         confidence=pose.body.confidence.copy())
+    return Pose(header=header, body=body)
+
+
+class PoseCache:
+    """Thread safe LRU cache of parsed poses, bounded by the total size of their tensors."""
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else PoseCacheSettings.max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    @property
+    def is_full(self) -> bool:
+        return self.current_bytes >= self.max_bytes
+
+    def get(self, key: str) -> Optional[Pose]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            pose = entry[0]
+        return copy_pose(pose)
+
+    def set(self, key: str, pose: Pose) -> bool:
+        size = pose_nbytes(pose)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (pose, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,35 +1,30 @@
-# # spoken_to_signed/gloss_to_pose/lookup/vietnamese_lookup.py
+from pathlib import Path
 
-# class VietnamesePoseLookup(CSVPoseLookup):
-#     def __init__(self):
-#         lexicon_dir = Path(__file__).parent.parent.parent / "assets" / "vietnamese_lexicon"
-#         super().__init__(directory=str(lexicon_dir))
+from .csv_lookup import CSVPoseLookup
+from .fuzzy_index import FuzzyIndex
 
-#     def lookup(self, word: str, gloss: str, spoken_language: str, signed_language: str) -> Pose:
-#         # Lookup pose file từ index
-#         if word in self.words_index[spoken_language][signed_language]:
-#             rows = self.words_index[spoken_language][signed_language][word]
-#             return self.get_pose(self.get_best_row(rows, word))
-            
-#         # Tìm từ gần nghĩa nhất nếu không có từ chính xác
-#         closest_word = find_closest_word(word, self.words_index[spoken_language][signed_language].keys())
-#         if closest_word:
-#             rows = self.words_index[spoken_language][signed_language][closest_word] 
-#             return self.get_pose(self.get_best_row(rows, closest_word))
-            
-#         raise FileNotFoundError(f"No pose found for {word}")
-from pathlib import Path
-from .lookup import CSVPoseLookup
 
 class VietnamesePoseLookup(CSVPoseLookup):
-    def __init__(self):
-        lexicon_dir = Path(__file__).parent.parent.parent / "assets" / "vietnamese_lexicon"
+    def __init__(self, directory: str = None):
+        lexicon_dir = directory or Path(__file__).parent.parent.parent / "assets" / "vietnamese_lexicon"
         super().__init__(directory=str(lexicon_dir))
+        self.fuzzy_indexes = {}
+
+    def fuzzy_index(self, spoken_language: str, signed_language: str) -> FuzzyIndex:
+        # Chỉ dựng khi có từ không nằm trong từ điển
+        key = (spoken_language, signed_language)
+        if key not in self.fuzzy_indexes:
+            self.fuzzy_indexes[key] = FuzzyIndex(self.words_index[spoken_language][signed_language])
+        return self.fuzzy_indexes[key]
+
+    def lookup(self, text: str, gloss: str, spoken_language: str, signed_language: str, source: str = None):
+        words = self.words_index[spoken_language][signed_language]
+        term = text.lower()
+        if term not in words:
+            # Không có từ chính xác: tìm từ gần nhất (thiếu dấu, sai chính tả nhẹ), xem FuzzySettings
+            term = self.fuzzy_index(spoken_language, signed_language).closest(term)
+            if term is None:
+                raise FileNotFoundError(f"No pose found for {text}")
 
-    def lookup(self, text: str, gloss: str, spoken_language: str, signed_language: str):
-        
-        if text in self.words_index[spoken_language][signed_language]:
-            rows = self.words_index[spoken_language][signed_language][text]
-            return self.get_pose(self.get_best_row(rows, text))
-        
-        raise FileNotFoundError(f"No pose found for {text}")
\ No newline at end of file
+        rows = words[term]
+        return self.get_pose(self.get_best_row(rows, text))
@@ -1,97 +1,299 @@
-import math
-from typing import List
+import logging
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
 
 import numpy as np
-import scipy.signal
 from pose_format import Pose
 from pose_format.numpy import NumPyPoseBody
-from scipy.spatial.distance import cdist
 
+from spoken_to_signed.gloss_to_pose.transitions import connection_point, window_size
+from spoken_to_signed.metrics import span
 
-def pose_savgol_filter(pose: Pose):
-    # If we want this to be faster, here is a possible solution
-    # https://stackoverflow.com/questions/75221888/fast-savgol-filter-on-3d-tensor/75406720#75406720
+logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=None)
+def _smoothing_point_ranges(components: Tuple[Tuple[str, int], ...]) -> Tuple[Tuple[int, int], ...]:
     # Smoothing the face does not result in a good result, so we skip it
-    [face_component] = [c for c in pose.header.components if c.name == 'FACE_LANDMARKS']
-    face_range = range(
-        pose.header._get_point_index('FACE_LANDMARKS', face_component.points[0]),
-        pose.header._get_point_index('FACE_LANDMARKS', face_component.points[-1]),
-    )
-
-    _, _, points, dims = pose.body.data.shape
-    for p in range(points):
-        if p not in face_range:
-            for d in range(dims):
-                pose.body.data[:, 0, p, d] = scipy.signal.savgol_filter(pose.body.data[:, 0, p, d], 3, 1)
+    ranges = []
+    start = 0
+    for name, points in components:
+        if name != 'FACE_LANDMARKS':
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], start + points)
+            else:
+                ranges.append((start, start + points))
+        start += points
+    return tuple(ranges)
+
+
+def smoothing_point_ranges(pose: Pose) -> Tuple[Tuple[int, int], ...]:
+    """Contiguous (start, end) point ranges that are smoothed"""
+    return _smoothing_point_ranges(tuple((c.name, len(c.points)) for c in pose.header.components))
+
+
+def pose_savgol_filter(pose: Pose, window_length=3, polyorder=1):
+    frames = len(pose.body.data)
+    if frames < window_length:
+        # Not enough frames to fit the filter, nothing to smooth
+        return pose
+
+    # Filter every (person, point, dimension) series along the time axis at once, one range of points at a time:
+    # slices are views, where a mask would copy all the smoothed points (and the filter output is another copy)
+    # scipy.signal takes about a second to import, only paid once a pose is smoothed
+    from scipy.signal import savgol_filter
+
+    with span("savgol", frames=frames):
+        data = np.ma.getdata(pose.body.data)
+        for start, end in smoothing_point_ranges(pose):
+            data[:, :, start:end] = savgol_filter(data[:, :, start:end], window_length, polyorder, axis=0)
     return pose
 
 
+class StreamingSavgolFilter:
+    """
+    pose_savgol_filter over a pose that arrives in segments, with the same result as filtering the whole pose.
+    A frame is only smoothed once the frame after it is known, so the last frame of each segment is held back.
+    """
+
+    def __init__(self, window_length=3, polyorder=1):
+        self.window_length = window_length
+        self.polyorder = polyorder
+        self.pose = None  # The last window_length frames seen
+        self.held = 0  # How many of them were not returned yet
+
+    def push(self, segment: Pose) -> Optional[Pose]:
+        if self.pose is None:
+            pose = Pose(segment.header, segment.body)
+        else:
+            pose = Pose(segment.header, NumPyPoseBody(
+                fps=segment.body.fps,
+                data=np.concatenate((self.pose.body.data, segment.body.data)),
+                confidence=np.concatenate((self.pose.body.confidence, segment.body.confidence))))
+        held = self.held + len(segment.body.data)
+
+        frames = len(pose.body.data)
+        if frames < self.window_length:
+            self.pose, self.held = pose, held
+            return None
+
+        # The filter works in place, keep the unfiltered frames for the next segment
+        context = pose.body[frames - self.window_length:]
+        self.pose = Pose(pose.header, NumPyPoseBody(fps=context.fps, data=context.data.copy(),
+                                                    confidence=context.confidence.copy()))
+        self.held = 1
+        smoothed = pose_savgol_filter(pose, self.window_length, self.polyorder)
+        return Pose(pose.header, smoothed.body[frames - held:frames - 1])
+
+    def flush(self) -> Optional[Pose]:
+        if self.held == 0:
+            return None
+        smoothed = pose_savgol_filter(self.pose, self.window_length, self.polyorder)
+        held, self.pose, self.held = self.held, None, 0
+        return Pose(smoothed.header, smoothed.body[len(smoothed.body.data) - held:])
+
+
 def create_padding(time: float, example: Pose) -> NumPyPoseBody:
     fps = example.body.fps
     padding_frames = int(time * fps)
     data_shape = example.body.data.shape
     return NumPyPoseBody(fps=fps,
-                         data=np.zeros(shape=(padding_frames, data_shape[1], data_shape[2], data_shape[3])),
-                         confidence=np.zeros(shape=(padding_frames, data_shape[1], data_shape[2])))
+                         data=np.zeros(shape=(padding_frames, data_shape[1], data_shape[2], data_shape[3]),
+                                       dtype=example.body.data.dtype),
+                         confidence=np.zeros(shape=(padding_frames, data_shape[1], data_shape[2]),
+                                             dtype=example.body.confidence.dtype))
+
+
+class StreamingGapFiller:
+    """
+    Linear interpolation of every point over the frames where it is missing (zero confidence), between the closest
+    frames around them where it is present, over frames that arrive in segments. A point can stay missing across
+    segments (a hand absent from a whole sign): the frames after its last presence are held back until it reappears,
+    so the result is the same as filling the whole sequence at once. Points missing up to an end stay missing.
+    """
+
+    def __init__(self):
+        self.data = None  # The frames not returned yet
+        self.confidence = None
+        self.offset = 0  # Index of the first of them in the whole sequence
+        self.anchor = None  # Index of the last frame where each point was present, -1 if never
+        self.anchor_data = None  # And the point on that frame, it may already be returned
+        self.anchor_confidence = None
+
+    def push(self, data: np.ndarray, confidence: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Adds frames, returns the frames (filled) that no later frame can change"""
+        if self.data is None:
+            # Copies: the frames are filled in place, and may be read-only views of a compiled lexicon
+            self.data, self.confidence = np.array(data), np.array(confidence)
+            self.anchor = np.full(confidence.shape[1:], -1)
+            self.anchor_data = np.zeros(data.shape[1:], dtype=data.dtype)
+            self.anchor_confidence = np.zeros(confidence.shape[1:], dtype=confidence.dtype)
+        else:
+            self.data = np.concatenate((self.data, data))
+            self.confidence = np.concatenate((self.confidence, confidence))
 
+        frames = len(self.data)
+        end = self.offset + frames
+        present = self.confidence > 0
+        index = (self.offset + np.arange(frames)).reshape(-1, *([1] * (present.ndim - 1)))
+        before = np.maximum(np.maximum.accumulate(np.where(present, index, -1), axis=0), self.anchor)
+        after = np.minimum.accumulate(np.where(present, index, end)[::-1], axis=0)[::-1]
+        gaps = ~present & (before >= 0) & (after < end)
+        if gaps.any():
+            with span("fill_gap", frames=frames):
+                self._fill(gaps, before, after)
 
-def concatenate_poses(poses: List[Pose], padding: NumPyPoseBody, interpolation='linear') -> Pose:
-    # Add padding to all poses except the last one
-    for pose in poses[:-1]:
-        pose.body.data = np.concatenate((pose.body.data, padding.data))
-        pose.body.confidence = np.concatenate((pose.body.confidence, padding.confidence))
+        # Points missing since their last presence hold back the frames after it, until they reappear
+        open_points = ~present[-1] & (before[-1] >= 0)
+        ready = frames if not open_points.any() else max(0, int(before[-1][open_points].min()) + 1 - self.offset)
 
-    # Concatenate all tensors
-    new_data = np.concatenate([pose.body.data for pose in poses])
-    new_conf = np.concatenate([pose.body.confidence for pose in poses])
-    new_body = NumPyPoseBody(fps=poses[0].body.fps, data=new_data, confidence=new_conf)
-    new_body = new_body.interpolate(kind=interpolation)
+        last = np.max(np.where(present | gaps, index, -1), axis=0)
+        person, point = np.nonzero(last >= self.offset)
+        self.anchor_data[person, point] = self.data[last[person, point] - self.offset, person, point]
+        self.anchor_confidence[person, point] = self.confidence[last[person, point] - self.offset, person, point]
+        self.anchor = np.maximum(self.anchor, last)
 
-    # If a point appears in pose1 and pose3 but not pose2, it will be smoothed in pose2, which is ugly
-    # TODO: for every conf, if all of it is 0, update it in the new one
+        data, confidence = self.data[:ready], self.confidence[:ready]
+        self.data, self.confidence = self.data[ready:], self.confidence[ready:]
+        self.offset += ready
+        return data, confidence
 
-    return Pose(header=poses[0].header, body=new_body)
+    def _fill(self, gaps: np.ndarray, before: np.ndarray, after: np.ndarray):
+        frame, person, point = np.nonzero(gaps)
+        before, after = before[gaps], after[gaps] - self.offset
+        weight = ((frame + self.offset - before) / (after + self.offset - before)).astype(self.data.dtype)
+        # The frame before a gap is either still held, or the point's anchor
+        held = before >= self.offset
+        before = np.maximum(before - self.offset, 0)
+        before_data = np.where(held[:, None], self.data[before, person, point], self.anchor_data[person, point])
+        before_confidence = np.where(held, self.confidence[before, person, point],
+                                     self.anchor_confidence[person, point])
+        self.data[frame, person, point] = before_data * (1 - weight[:, None]) \
+            + self.data[after, person, point] * weight[:, None]
+        self.confidence[frame, person, point] = before_confidence * (1 - weight) \
+            + self.confidence[after, person, point] * weight
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The frames held back, once no frame follows"""
+        if self.data is None:
+            return np.zeros((0,)), np.zeros((0,))
+        data, confidence = self.data, self.confidence
+        self.data = self.confidence = self.anchor = self.anchor_data = self.anchor_confidence = None
+        self.offset = 0
+        return data, confidence
 
 
 def find_best_connection_point(pose1: Pose, pose2: Pose, window=0.3):
-    # window size in seconds, or percentage of the pose, whichever is smaller
-    p1_size = math.ceil(min(window * pose1.body.fps, len(pose1.body.data) * window))
-    p2_size = math.ceil(min(window * pose2.body.fps, len(pose2.body.data) * window))
+    # Lexicon entries come with their lexicon's transition index, where the join may already be known
+    transitions = getattr(pose1, "transitions", None)
+    with span("connection_point"):
+        if transitions is not None and transitions is getattr(pose2, "transitions", None):
+            return transitions.connection_point(pose1, pose2, window)
+        return connection_point(pose1, pose2, window)
 
-    last_data = pose1.body.data[len(pose1.body.data) - p1_size:]
-    first_data = pose2.body.data[:p2_size]
 
-    last_vectors = last_data.reshape(len(last_data), -1)
-    first_vectors = first_data.reshape(len(first_data), -1)
+class PoseConcatenator:
+    """
+    Joins poses one at a time, as they arrive. Each append picks the join with the previous pose and returns the
+    frames no later pose can change, with the points missing between frames where they are present interpolated
+    (over the padding between poses, or over whole poses where a point is absent), then smoothed.
+    The work per pose is its own frames plus the frames held back for missing points, so a sentence costs linearly
+    in its signs.
+    """
 
-    distances_matrix = cdist(last_vectors, first_vectors, 'euclidean')
-    min_index = np.unravel_index(np.argmin(distances_matrix, axis=None), distances_matrix.shape)
-    last_index = len(pose1.body.data) - p1_size + min_index[0]
-    return last_index, min_index[1]
+    def __init__(self, padding=0.20, window=0.3, window_length=3, polyorder=1):
+        self.padding = padding
+        self.window = window
+        self.filling = StreamingGapFiller()
+        self.smoothing = StreamingSavgolFilter(window_length, polyorder)
+        self.header = None
+        self.padding_body = None
+        self.previous = None  # The last pose, the next join may still cut its tail
+        self.emitted = 0  # Frames of the last pose already pushed (or cut by its join with the pose before)
 
+    def _cut_window(self, pose: Pose) -> int:
+        # A join only ever cuts the first pose within its last window_size frames
+        return window_size(len(pose.body.data), pose.body.fps, self.window)
 
-def smooth_concatenate_poses(poses: List[Pose], padding=0.20) -> Pose:
+    def _smooth(self, data: np.ndarray, confidence: np.ndarray) -> List[Pose]:
+        if len(data) == 0:
+            return []
+        body = NumPyPoseBody(fps=self.padding_body.fps, data=data, confidence=confidence)
+        segment = self.smoothing.push(Pose(self.header, body))
+        return [segment] if segment is not None and len(segment.body.data) > 0 else []
+
+    def _push(self, data: np.ndarray, confidence: np.ndarray) -> List[Pose]:
+        if len(data) == 0:
+            return []
+        return self._smooth(*self.filling.push(data, confidence))
+
+    def _push_frames(self, pose: Pose, start: int, end: int) -> List[Pose]:
+        return self._push(np.ma.getdata(pose.body.data)[start:end], pose.body.confidence[start:end])
+
+    def append(self, pose: Pose) -> List[Pose]:
+        """Adds the next pose, returns the segments it finished"""
+        if len(pose.body.data) == 0:
+            raise ValueError("Cannot concatenate an empty pose")
+
+        segments = []
+        if self.previous is None:
+            self.header = pose.header
+            self.padding_body = create_padding(self.padding, pose)
+            start = 0
+        else:
+            # Joins are picked on the poses as they were recorded, like the precomputed transitions
+            end, start = find_best_connection_point(self.previous, pose, self.window)
+            # The tail of the previous pose up to the join, then the padding
+            segments += self._push_frames(self.previous, self.emitted, end)
+            segments += self._push(self.padding_body.data, self.padding_body.confidence)
+
+        # Up to the window the next join cuts in
+        self.previous = pose
+        safe = max(start, len(pose.body.data) - self._cut_window(pose))
+        segments += self._push_frames(pose, start, safe)
+        self.emitted = safe
+        return segments
+
+    def finish(self) -> List[Pose]:
+        """The last frames, once no pose follows"""
+        if self.previous is None:
+            return []
+        segments = self._push_frames(self.previous, self.emitted, len(self.previous.body.data))
+        segments += self._smooth(*self.filling.finish())
+        segment = self.smoothing.flush()
+        if segment is not None and len(segment.body.data) > 0:
+            segments.append(segment)
+        self.previous = None
+        return segments
+
+
+def smooth_concatenate_stream(poses: List[Pose], padding=0.20) -> Iterator[Pose]:
+    """
+    Like smooth_concatenate_poses, but yields the result segment by segment, as soon as no later pose can change it
+    """
     if len(poses) == 0:
         raise ValueError("No poses to smooth")
 
     if len(poses) == 1:
-        return poses[0]
+        yield poses[0]
+        return
 
-    start = 0
+    concatenator = PoseConcatenator(padding)
     for i, pose in enumerate(poses):
-        print('Processing', i + 1, 'of', len(poses), '...')
-        if i != len(poses) - 1:
-            end, next_start = find_best_connection_point(poses[i], poses[i + 1])
-        else:
-            end = len(pose.body.data)
-            next_start = None
+        logger.debug("Streaming %d of %d", i + 1, len(poses))
+        yield from concatenator.append(pose)
+    yield from concatenator.finish()
+
+
+def smooth_concatenate_poses(poses: List[Pose], padding=0.20) -> Pose:
+    if len(poses) == 0:
+        raise ValueError("No poses to smooth")
 
-        pose.body = pose.body[start:end]
-        start = next_start
+    if len(poses) == 1:
+        return poses[0]
 
-    padding_pose = create_padding(padding, poses[0])
-    print('Concatenating...')
-    single_pose = concatenate_poses(poses, padding_pose)
-    print('Smoothing...')
-    return pose_savgol_filter(single_pose)
+    segments = list(smooth_concatenate_stream(poses, padding))
+    body = NumPyPoseBody(fps=poses[0].body.fps,
+                         data=np.concatenate([np.ma.getdata(s.body.data) for s in segments]),
+                         confidence=np.concatenate([s.body.confidence for s in segments]))
+    return Pose(header=poses[0].header, body=body)
@@ -0,0 +1,194 @@
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+from pose_format import Pose
+from pose_format.pose_header import PoseHeader
+
+# Joins are chosen on the arms and hands only: the face barely moves between signs and would dominate the distance
+TRANSITION_POINTS = {
+    "POSE_LANDMARKS": ["LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_ELBOW", "RIGHT_ELBOW", "LEFT_WRIST", "RIGHT_WRIST"],
+    "LEFT_HAND_LANDMARKS": None,  # All points
+    "RIGHT_HAND_LANDMARKS": None,
+}
+
+
+class TransitionSettings:
+    # Lexicons up to this size get the full pair table when compiled (entries² × 4 bytes)
+    max_precomputed_entries = 5000
+    max_memoized_pairs = 100000
+
+
+@lru_cache(maxsize=None)
+def _transition_points(components: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> np.ndarray:
+    indexes = []
+    offset = 0
+    for name, points in components:
+        if name in TRANSITION_POINTS:
+            wanted = TRANSITION_POINTS[name]
+            indexes.extend(offset + i for i, point in enumerate(points) if wanted is None or point in wanted)
+        offset += len(points)
+
+    if not indexes:
+        # Not a holistic pose, compare all points
+        return np.arange(offset)
+    return np.array(indexes)
+
+
+def transition_points(header: PoseHeader) -> np.ndarray:
+    return _transition_points(tuple((c.name, tuple(c.points)) for c in header.components))
+
+
+def window_size(frames: int, fps: float, window=0.3) -> int:
+    # window size in seconds, or percentage of the pose, whichever is smaller
+    return math.ceil(min(window * fps, frames * window))
+
+
+def transition_vectors(data, points: np.ndarray) -> np.ndarray:
+    data = np.ma.filled(data, 0)[:, :, points]
+    return data.reshape(len(data), -1)
+
+
+def best_cut(last_vectors: np.ndarray, first_vectors: np.ndarray) -> Tuple[int, int]:
+    distances = ((last_vectors[:, None] - first_vectors[None]) ** 2).sum(axis=-1)
+    last_index, first_index = np.unravel_index(np.argmin(distances), distances.shape)
+    return int(last_index), int(first_index)
+
+
+def connection_point(pose1: Pose, pose2: Pose, window=0.3) -> Tuple[int, int]:
+    """Best (last frame of pose1, first frame of pose2) to join the two poses"""
+    p1_size = window_size(len(pose1.body.data), pose1.body.fps, window)
+    p2_size = window_size(len(pose2.body.data), pose2.body.fps, window)
+
+    points = transition_points(pose1.header)
+    last_vectors = transition_vectors(pose1.body.data[len(pose1.body.data) - p1_size:], points)
+    first_vectors = transition_vectors(pose2.body.data[:p2_size], points)
+
+    last_index, first_index = best_cut(last_vectors, first_vectors)
+    return len(pose1.body.data) - p1_size + last_index, first_index
+
+
+def compute_transitions(tails: List[np.ndarray], heads: List[np.ndarray], batch_bytes=64 * 1024 * 1024) -> np.ndarray:
+    """
+    Best cut for every ordered pair (a, b), from the tail window vectors of a and the head window vectors of b.
+    Returns an (entries, entries, 2) array of (frames from the end of a, frame of b).
+    """
+    entries = len(tails)
+    width = max(max(len(t) for t in tails), max(len(h) for h in heads))
+    dims = tails[0].shape[1]
+
+    # Pad every window to the same width, padded frames are never picked
+    tail_array = np.zeros((entries, width, dims), dtype=np.float32)
+    head_array = np.zeros((entries, width, dims), dtype=np.float32)
+    tail_valid = np.zeros((entries, width), dtype=bool)
+    head_valid = np.zeros((entries, width), dtype=bool)
+    tail_sizes = np.array([len(t) for t in tails])
+    for i, (tail, head) in enumerate(zip(tails, heads)):
+        tail_array[i, :len(tail)] = tail
+        head_array[i, :len(head)] = head
+        tail_valid[i, :len(tail)] = True
+        head_valid[i, :len(head)] = True
+
+    heads_flat = head_array.reshape(entries * width, dims)
+    heads_norm = (heads_flat ** 2).sum(axis=1)
+
+    cuts = np.empty((entries, entries, 2), dtype=np.int16)
+    batch = max(1, batch_bytes // (width * entries * width * 4))
+    for start in range(0, entries, batch):
+        end = min(start + batch, entries)
+        tails_flat = tail_array[start:end].reshape(-1, dims)
+        # |t - h|² = |t|² + |h|² - 2 t·h, for the whole batch in one matrix product
+        distances = (tails_flat ** 2).sum(axis=1)[:, None] + heads_norm[None, :] - 2 * tails_flat @ heads_flat.T
+        distances = distances.reshape(end - start, width, entries, width).transpose(0, 2, 1, 3)
+        valid = tail_valid[start:end, None, :, None] & head_valid[None, :, None, :]  # (a, b, tail frame, head frame)
+        distances = np.where(valid, distances, np.inf)
+
+        distances = distances.reshape(end - start, entries, width * width)
+        best = np.argmin(distances, axis=-1)
+        cuts[start:end, :, 0] = tail_sizes[start:end, None] - best // width
+        cuts[start:end, :, 1] = best % width
+        # Pairs with an empty window have no join
+        cuts[start:end][np.isinf(distances.min(axis=-1))] = -1
+
+    return cuts
+
+
+class TransitionIndex:
+    """
+    Best cut frames between ordered pairs of lexicon entries.
+    Pairs of a compiled lexicon are precomputed (for their signing boundaries), the rest is memoized on first use.
+    """
+
+    def __init__(self, cuts: np.ndarray = None, boundaries: np.ndarray = None, windows: np.ndarray = None):
+        self.cuts = cuts
+        self.boundaries = boundaries
+        self.windows = windows
+        self.precomputed_hits = 0
+        self.memoized_hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _precomputed(self, pose1: Pose, pose2: Pose, window: float) -> Optional[Tuple[int, int]]:
+        a = getattr(pose1, "lexicon_entry", None)
+        b = getattr(pose2, "lexicon_entry", None)
+        if self.cuts is None or window != 0.3 or not isinstance(a, int) or not isinstance(b, int):
+            return None
+
+        # The table holds the joins of poses trimmed to their signing boundary, valid as long as the tail of pose1
+        # and the head of pose2 are the same frames (the other end of each pose does not matter)
+        frame_range1 = getattr(pose1, "frame_range", None)
+        frame_range2 = getattr(pose2, "frame_range", None)
+        if frame_range1 is None or frame_range2 is None \
+                or frame_range1[1] != self.boundaries[a][1] or frame_range2[0] != self.boundaries[b][0] \
+                or window_size(len(pose1.body.data), pose1.body.fps) != self.windows[a] \
+                or window_size(len(pose2.body.data), pose2.body.fps) != self.windows[b]:
+            return None
+
+        from_end, first_index = self.cuts[a, b]
+        if from_end < 0:
+            return None
+        return len(pose1.body.data) - int(from_end), int(first_index)
+
+    def _memo_key(self, pose1: Pose, pose2: Pose, window: float) -> Optional[Hashable]:
+        a = getattr(pose1, "lexicon_entry", None)
+        b = getattr(pose2, "lexicon_entry", None)
+        if a is None or b is None:
+            return None
+        return (a, getattr(pose1, "frame_range", None), len(pose1.body.data),
+                b, getattr(pose2, "frame_range", None), len(pose2.body.data), window)
+
+    def connection_point(self, pose1: Pose, pose2: Pose, window=0.3) -> Tuple[int, int]:
+        cut = self._precomputed(pose1, pose2, window)
+        if cut is not None:
+            self.precomputed_hits += 1
+            return cut
+
+        key = self._memo_key(pose1, pose2, window)
+        if key is not None:
+            with self._lock:
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    self.memoized_hits += 1
+                    return self._memo[key]
+
+        self.misses += 1
+        cut = connection_point(pose1, pose2, window)
+        if key is not None:
+            with self._lock:
+                self._memo[key] = cut
+                if len(self._memo) > TransitionSettings.max_memoized_pairs:
+                    self._memo.popitem(last=False)
+        return cut
+
+    def stats(self) -> dict:
+        return {
+            "precomputed_pairs": 0 if self.cuts is None else len(self.cuts) ** 2,
+            "memoized_pairs": len(self._memo),
+            "precomputed_hits": self.precomputed_hits,
+            "memoized_hits": self.memoized_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,218 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached lookup to a full render
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes, 1MB to 2GB
+MEMORY_BUCKETS = tuple(2 ** power for power in range(20, 32))
+
+Labels = Tuple[Tuple[str, str], ...]
+# (metric name, type, help, [(labels, value)]) reported by a collector when the metrics are scraped
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # labels -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        self._metrics.append(Counter(name, help))
+        return self._metrics[-1]
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        self._metrics.append(Histogram(name, help, buckets))
+        return self._metrics[-1]
+
+    def collector(self, collect: Callable[[], List[Sample]]):
+        """Metrics read from elsewhere (cache stats, queue depths...) when scraped"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """All the metrics in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            for name, kind, help, values in collect():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(_labels(labels))} {value}" for labels, value in values]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("text2sign_stage_seconds", "Time spent in each pipeline stage")
+STAGE_ERRORS = REGISTRY.counter("text2sign_stage_errors_total", "Pipeline stage runs that raised an error")
+STAGE_MEMORY = REGISTRY.histogram("text2sign_stage_peak_memory_bytes",
+                                  "Growth of the resident memory of the process, at its peak, while a stage ran",
+                                  MEMORY_BUCKETS)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a pipeline stage: latency histogram, error counter and a debug log record with the fields"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s took %.1fms", stage, seconds * 1000, extra={"stage": stage, "seconds": seconds, **fields})
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """Items of the iterable, with the time spent producing them (not consuming them) recorded as one span"""
+    iterator = iter(iterable)
+    seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            yield item
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        # Closed early (e.g. ffmpeg failed), the producer gets to clean up too
+        if hasattr(iterator, "close"):
+            iterator.close()
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s took %.1fms", stage, seconds * 1000, extra={"stage": stage, "seconds": seconds})
+
+
+def rss_bytes() -> int:
+    """Resident memory of the process now, 0 where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def max_rss_bytes() -> int:
+    """Highest resident memory of the process since it started"""
+    if resource is None:
+        return rss_bytes()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, counted a little differently than /proc/self/statm
+    return max(max_rss if sys.platform == "darwin" else max_rss * 1024, rss_bytes())
+
+
+@contextmanager
+def peak_memory(stage: str, interval: float = 0.01):
+    """
+    Sample the resident memory while the block runs and record how far above its starting point it went.
+    The memory is the process's: stages running at the same time in other threads are counted too.
+    Yields a dict, filled with the measure ("peak_bytes") when the block exits.
+    """
+    start = rss_bytes()
+    peak = [start]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], rss_bytes())
+
+    sampler = threading.Thread(target=sample, name=f"rss-{stage}", daemon=True)
+    sampler.start()
+    result = {}
+    try:
+        yield result
+    finally:
+        done.set()
+        sampler.join()
+        result["peak_bytes"] = max(peak[0], rss_bytes()) - start
+        STAGE_MEMORY.observe(result["peak_bytes"], stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s peaked at +%.1fMB", stage, result["peak_bytes"] / 2 ** 20,
+                         extra={"stage": stage, "peak_bytes": result["peak_bytes"]})
@@ -0,0 +1,69 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+_DONE = object()
+
+# A stage handles a batch of items (dicts) in place, and takes up to `batch_size` items at a time
+Stage = Tuple[Callable[[List[dict]], None], int]
+
+
+def for_each(handler: Callable[[dict], None]) -> Callable[[List[dict]], None]:
+    """A stage handler that handles items one by one, a failing item does not fail the others"""
+    def handle(items: List[dict]):
+        for item in items:
+            try:
+                handler(item)
+            except Exception as e:
+                item["error"] = str(e)
+    return handle
+
+
+def _run_stage(handler: Callable[[List[dict]], None], batch_size: int, inbox: queue.Queue, outbox: queue.Queue):
+    done = False
+    while not done:
+        batch = []
+        while len(batch) < batch_size:
+            item = inbox.get()
+            if item is _DONE:
+                done = True
+                break
+            batch.append(item)
+
+        # Items that failed in an earlier stage skip the next ones
+        pending = [item for item in batch if "error" not in item]
+        if pending:
+            try:
+                handler(pending)
+            except Exception as e:
+                for item in pending:
+                    item.setdefault("error", str(e))
+        for item in batch:
+            outbox.put(item)
+    outbox.put(_DONE)
+
+
+def run_pipeline(items: Iterable[dict], stages: List[Stage], queue_size: int = 8) -> Iterator[dict]:
+    """
+    Run every stage in its own thread, with bounded queues in between so that the stages overlap
+    without reading ahead of the slowest one. Items are yielded in order, with an "error" when they failed.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    threads = [threading.Thread(target=_run_stage, args=(handler, batch_size, queues[i], queues[i + 1]),
+                                name=f"pipeline-{i}", daemon=True)
+               for i, (handler, batch_size) in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+
+    def feed():
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+    threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        yield item
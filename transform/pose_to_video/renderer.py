@@ -0,0 +1,190 @@
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+from collections import deque
+from functools import lru_cache
+from itertools import chain
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+from pose_format import Pose
+from pose_format.numpy import NumPyPoseBody
+
+from spoken_to_signed.metrics import span, timed_iter
+
+
+class RenderSettings:
+    ffmpeg = "/usr/bin/ffmpeg"
+    output_fps = 25
+    preset = "medium"
+    # Fragmented MP4, playable while it is still being written (see render_video_stream)
+    streaming = False
+    # Processes drawing the frames (1: drawn in the calling thread), each one draws chunks of consecutive frames
+    draw_workers = 1
+    draw_chunk_frames = 16
+
+
+def _draw_serial(pose: Pose) -> Iterator[np.ndarray]:
+    from pose_format.pose_visualizer import PoseVisualizer
+
+    return PoseVisualizer(pose).draw()
+
+
+@lru_cache(maxsize=None)
+def get_draw_pool(workers: int):
+    # Forked workers do not re-import the application; start the pool before any other thread when possible
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method).Pool(workers)
+
+
+def _shared_array(shm: SharedMemory, shape: Tuple[int, ...], dtype) -> np.ndarray:
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # Attaching registers the block with the worker's resource tracker, which would warn about it (and unlink it)
+    # when the worker exits, the process that created the block owns it
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _draw_chunk(header, fps: float, data_spec, confidence_spec, output_spec, start: int, end: int, slot: int) -> int:
+    # Runs in a pool worker: reads the pose and writes the frames through shared memory, nothing large is pickled
+    shms = [_attach_shared_memory(spec[0]) for spec in (data_spec, confidence_spec, output_spec)]
+    try:
+        data, confidence, output = [_shared_array(shm, shape, dtype)
+                                    for shm, (_, shape, dtype) in zip(shms, (data_spec, confidence_spec, output_spec))]
+        body = NumPyPoseBody(fps=fps, data=data[start:end], confidence=confidence[start:end])
+        for i, frame in enumerate(_draw_serial(Pose(header, body))):
+            output[slot, i] = frame
+        del data, confidence, output, body, frame
+        return end - start
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+def draw_frames_parallel(pose: Pose, workers: int) -> Iterator[np.ndarray]:
+    """Same frames as the serial drawing, in order, drawn in chunks by a process pool"""
+    chunk_frames = RenderSettings.draw_chunk_frames
+    data = np.asarray(pose.body.data)
+    confidence = np.asarray(pose.body.confidence)
+    height, width = pose.header.dimensions.height, pose.header.dimensions.width
+    # Drawn chunks wait in a ring of slots until the encoder takes them, which bounds the memory used
+    slots = 2 * workers
+    output_shape = (slots, chunk_frames, height, width, 3)
+
+    shms = [SharedMemory(create=True, size=max(1, size))
+            for size in (data.nbytes, confidence.nbytes, int(np.prod(output_shape)))]
+    output = None
+    try:
+        data_spec = (shms[0].name, data.shape, data.dtype)
+        confidence_spec = (shms[1].name, confidence.shape, confidence.dtype)
+        output_spec = (shms[2].name, output_shape, np.uint8)
+        _shared_array(shms[0], data.shape, data.dtype)[:] = data
+        _shared_array(shms[1], confidence.shape, confidence.dtype)[:] = confidence
+        output = _shared_array(shms[2], output_shape, np.uint8)
+
+        pool = get_draw_pool(workers)
+        chunks = deque((start, min(start + chunk_frames, len(data))) for start in range(0, len(data), chunk_frames))
+        free_slots = deque(range(slots))
+        pending = deque()
+        while chunks or pending:
+            while chunks and free_slots:
+                start, end = chunks.popleft()
+                slot = free_slots.popleft()
+                args = (pose.header, pose.body.fps, data_spec, confidence_spec, output_spec, start, end, slot)
+                pending.append((pool.apply_async(_draw_chunk, args), slot))
+
+            result, slot = pending.popleft()
+            for i in range(result.get()):
+                yield output[slot, i].copy()
+            free_slots.append(slot)
+    finally:
+        output = None  # The mappings can only be closed once no array uses them
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def draw_frames(pose: Pose) -> Iterator[np.ndarray]:
+    workers = RenderSettings.draw_workers
+    if workers > 1 and len(pose.body.data) >= 2 * RenderSettings.draw_chunk_frames:
+        return draw_frames_parallel(pose, workers)
+    return _draw_serial(pose)
+
+
+def encode_frames(frames: Iterable[np.ndarray], fps: float, video_path: str, fragmented=False):
+    """Stream BGR frames into a single libx264 process, no intermediate video file"""
+    # The "encode" span includes waiting for the frames, the drawing itself is also timed on its own
+    frames = timed_iter(frames, "draw")
+    with span("encode", fragmented=fragmented):
+        try:
+            _encode_frames(frames, fps, video_path, fragmented)
+        finally:
+            frames.close()
+
+
+def _encode_frames(frames: Iterator[np.ndarray], fps: float, video_path: str, fragmented: bool):
+    first_frame = next(frames, None)
+    if first_frame is None:
+        raise ValueError("Cannot encode a video without frames")
+
+    height, width = first_frame.shape[:2]
+    ffmpeg_cmd = [
+        RenderSettings.ffmpeg, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "-",
+        # yuv420p needs even dimensions
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+        "-c:v", "libx264", "-preset", RenderSettings.preset,
+        "-pix_fmt", "yuv420p",
+        "-r", str(RenderSettings.output_fps),
+    ]
+    if fragmented:
+        # A self-contained fragment every second, written as soon as it is encoded
+        ffmpeg_cmd += [
+            "-tune", "zerolatency", "-profile:v", "high", "-level", "4.0",
+            "-g", str(RenderSettings.output_fps),
+            "-movflags", "frag_keyframe+empty_moov+default_base_moof", "-flush_packets", "1",
+        ]
+    ffmpeg_cmd.append(video_path)
+
+    # stderr goes to a file, a full pipe would block ffmpeg while we are still writing frames
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            process.stdin.write(np.ascontiguousarray(first_frame).tobytes())
+            for frame in frames:
+                process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except BrokenPipeError:
+            pass  # ffmpeg exited early, its error is reported below
+        finally:
+            process.stdin.close()
+
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"FFmpeg error: {stderr.read().decode('utf-8', errors='replace')}")
+
+
+def render_video(pose: Pose, video_path: str) -> str:
+    encode_frames(draw_frames(pose), pose.body.fps, video_path)
+    return video_path
+
+
+def render_video_stream(segments: Iterable[Pose], video_path: str) -> str:
+    """Render pose segments as they arrive, into a fragmented MP4 that can be played while it grows"""
+    segments = iter(segments)
+    first_segment = next(segments, None)
+    if first_segment is None:
+        raise ValueError("Cannot encode a video without frames")
+
+    frames = chain.from_iterable(draw_frames(segment) for segment in chain([first_segment], segments))
+    encode_frames(frames, first_segment.body.fps, video_path, fragmented=True)
+    return video_path
@@ -0,0 +1,130 @@
+import gzip
+import struct
+from typing import List, Tuple
+
+import numpy as np
+from pose_format import Pose
+
+from spoken_to_signed.metrics import span
+
+# Compact pose for drawing in the browser (templates/index.html), all little-endian:
+#
+#     magic "T2SP", version u8, flags u8 (1: face dropped)
+#     fps f32, frames u32, points u16, width u16, height u16, step f32
+#     components u8, then for each: name (u8 length, utf-8), points u16, limbs u16, limbs as (u16, u16)
+#         indexes in the component, colors u8, colors as RGB u8
+#     visibility: frames rows of points bits (confidence > 0), most significant bit first
+#     coordinates: x and y of every point over the frames, in steps, as the difference with the previous frame
+#         (int16), point by point: all low bytes, then all high bytes
+#
+# Hidden points keep their last position, so that they cost nothing, and small differences leave high bytes
+# of 0 or 255: both compress very well.
+MAGIC = b"T2SP"
+VERSION = 1
+FLAG_NO_FACE = 1
+FACE_COMPONENT = "FACE_LANDMARKS"
+MEDIA_TYPE = "application/x-text2sign-pose"
+
+# Quantized coordinates stay within +-MAX_VALUE, so that the difference of two frames fits an int16
+MAX_VALUE = 2 ** 14 - 1
+
+
+class WireSettings:
+    # Quantization step in pixels, coarsened only when the pose would not fit (an error of at most half a step)
+    step = 1 / 8
+    face = True
+    gzip_level = 6
+    brotli_quality = 5
+
+
+def _kept_components(pose: Pose, face: bool) -> List[Tuple[object, int]]:
+    components = []
+    first = 0
+    for component in pose.header.components:
+        if face or component.name != FACE_COMPONENT:
+            components.append((component, first))
+        first += len(component.points)
+    return components
+
+
+def encode_pose(pose: Pose, face: bool = None) -> bytes:
+    """The first person of a pose in the wire format above, x and y only"""
+    face = WireSettings.face if face is None else face
+    with span("pose_encode"):
+        components = _kept_components(pose, face)
+        points = np.concatenate([np.arange(first, first + len(component.points)) for component, first in components])
+        data = np.ma.getdata(pose.body.data)[:, 0, points, :2].astype(np.float32)
+        visible = np.asarray(pose.body.confidence)[:, 0, points] > 0
+        frames = len(data)
+
+        limit = float(np.abs(data[visible]).max()) if visible.any() else 0
+        step = max(WireSettings.step, limit / MAX_VALUE)
+        values = np.rint(data / step).astype(np.int32)
+        # Hidden points stay where they were last seen (at 0 before that)
+        values[0][~visible[0]] = 0
+        last_seen = np.maximum.accumulate(np.where(visible, np.arange(frames)[:, None], 0), axis=0)
+        values = values[last_seen, np.arange(len(points))]
+
+        deltas = np.diff(values, axis=0, prepend=0).astype("<i2")
+        planes = deltas.transpose(1, 2, 0).reshape(-1).view(np.uint8).reshape(-1, 2).T
+
+        header = [MAGIC, struct.pack("<BBfIHHHf", VERSION, 0 if face else FLAG_NO_FACE, pose.body.fps, frames,
+                                     len(points), pose.header.dimensions.width, pose.header.dimensions.height, step),
+                  struct.pack("<B", len(components))]
+        for component, _ in components:
+            name = component.name.encode("utf-8")
+            limbs = np.asarray(component.limbs, dtype="<u2").reshape(-1, 2)
+            colors = np.asarray(component.colors, dtype=np.uint8).reshape(-1, 3)
+            header += [struct.pack("<B", len(name)), name, struct.pack("<HH", len(component.points), len(limbs)),
+                       limbs.tobytes(), struct.pack("<B", len(colors)), colors.tobytes()]
+
+        return b"".join(header + [np.packbits(visible, axis=1).tobytes(), planes.tobytes()])
+
+
+def decode_pose(data: bytes) -> dict:
+    """Back from the wire format, as the browser reads it: components, visibility and coordinates in pixels"""
+    if data[:4] != MAGIC or data[4] != VERSION:
+        raise ValueError("Not a text2sign pose")
+    _, flags, fps, frames, points, width, height, step = struct.unpack_from("<BBfIHHHf", data, 4)
+    offset = 4 + struct.calcsize("<BBfIHHHf")
+    count, = struct.unpack_from("<B", data, offset)
+    offset += 1
+
+    components = []
+    for _ in range(count):
+        length = data[offset]
+        name = data[offset + 1:offset + 1 + length].decode("utf-8")
+        offset += 1 + length
+        component_points, limbs = struct.unpack_from("<HH", data, offset)
+        offset += 4
+        limbs_array = np.frombuffer(data, dtype="<u2", count=limbs * 2, offset=offset).reshape(-1, 2)
+        offset += limbs * 4
+        colors = np.frombuffer(data, dtype=np.uint8, count=data[offset] * 3, offset=offset + 1).reshape(-1, 3)
+        offset += 1 + len(colors) * 3
+        components.append({"name": name, "points": component_points, "limbs": limbs_array, "colors": colors})
+
+    row = (points + 7) // 8
+    visible = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=frames * row, offset=offset).reshape(frames, row),
+                            axis=1, count=points).astype(bool)
+    offset += frames * row
+    planes = np.frombuffer(data, dtype=np.uint8, count=points * 2 * frames * 2, offset=offset).reshape(2, -1)
+    deltas = np.ascontiguousarray(planes.T).view("<i2").reshape(points, 2, frames)
+    xy = np.cumsum(deltas.astype(np.int32), axis=2).transpose(2, 0, 1) * step
+
+    return {"fps": fps, "width": width, "height": height, "face": not flags & FLAG_NO_FACE,
+            "components": components, "visible": visible, "xy": xy.astype(np.float32)}
+
+
+def compress(data: bytes, accept_encoding: str = "") -> Tuple[bytes, str]:
+    """The best Content-Encoding the client accepts: brotli (when installed), gzip, or none"""
+    accepted = {encoding.split(";")[0].strip() for encoding in accept_encoding.lower().split(",")}
+    if "br" in accepted:
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            return brotli.compress(data, quality=WireSettings.brotli_quality), "br"
+    if "gzip" in accepted:
+        return gzip.compress(data, compresslevel=WireSettings.gzip_level, mtime=0), "gzip"
+    return data, "identity"
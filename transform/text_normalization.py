@@ -0,0 +1,19 @@
+import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _fold_char(char: str) -> str:
+    if char in "đĐ":
+        return "d"
+    return unicodedata.normalize("NFD", char)[0].lower()
+
+
+def fold(term: str) -> str:
+    """Without diacritics, one character per character: "Đường" -> "duong" """
+    return "".join(_fold_char(char) for char in term)
+
+
+def trigrams(folded: str) -> set:
+    padded = f" {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
@@ -0,0 +1,200 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from spoken_to_signed.text_to_gloss.types import Gloss
+
+
+class GlossCacheSettings:
+    path = os.path.join(os.path.expanduser("~"), ".sign", "gloss_cache.sqlite")
+    ttl = 7 * 24 * 60 * 60  # seconds
+    max_entries = 10000
+
+
+def normalize_text(text: str) -> str:
+    # Case is kept on purpose: capitalized words are glossed as proper names
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class GlossCache:
+    """Persistent text -> gloss cache, where concurrent misses for the same key share one computation"""
+
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = None):
+        self.path = path if path is not None else GlossCacheSettings.path
+        self.ttl = ttl if ttl is not None else GlossCacheSettings.ttl
+        self.max_entries = max_entries if max_entries is not None else GlossCacheSettings.max_entries
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS glosses (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                latency REAL NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS glosses_accessed_at ON glosses (accessed_at)")
+        self._connection.commit()
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    def _get(self, key: str):
+        now = time.time()
+        row = self._connection.execute("SELECT result, latency, created_at FROM glosses WHERE key = ?",
+                                       (key,)).fetchone()
+        if row is None:
+            return None
+
+        result, latency, created_at = row
+        if now - created_at > self.ttl:
+            self._connection.execute("DELETE FROM glosses WHERE key = ?", (key,))
+            self._connection.commit()
+            return None
+
+        self._connection.execute("UPDATE glosses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._connection.commit()
+        return [[tuple(item) for item in gloss] for gloss in json.loads(result)], latency
+
+    def _set(self, key: str, result: List[Gloss], latency: float):
+        now = time.time()
+        self._connection.execute("INSERT OR REPLACE INTO glosses VALUES (?, ?, ?, ?, ?)",
+                                 (key, json.dumps(result, ensure_ascii=False), latency, now, now))
+        # Evict expired entries, then the least recently used ones over the size limit
+        self._connection.execute("DELETE FROM glosses WHERE created_at < ?", (now - self.ttl,))
+        self._connection.execute("""
+            DELETE FROM glosses WHERE key IN (
+                SELECT key FROM glosses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[List[Gloss]]:
+        """The cached result, None on a miss (nothing is computed)"""
+        with self._lock:
+            cached = self._get(key)
+            if cached is None:
+                return None
+            result, latency = cached
+            self.hits += 1
+            self.saved_seconds += latency
+            return result
+
+    def get_or_compute(self, key: str, compute: Callable[[], List[Gloss]]) -> List[Gloss]:
+        with self._lock:
+            cached = self._get(key)
+            if cached is not None:
+                result, latency = cached
+                self.hits += 1
+                self.saved_seconds += latency
+                return result
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            result = compute()
+            latency = time.perf_counter() - start
+            # Empty results are errors (or nothing to sign), they are not worth remembering
+            if result:
+                with self._lock:
+                    self._set(key, result, latency)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def get_or_compute_many(self, keys: List[str],
+                            compute: Callable[[List[int]], List[List[Gloss]]]) -> List[List[Gloss]]:
+        """get_or_compute for several keys, compute(indexes) gets the indexes of all the missing keys at once"""
+        results = [None] * len(keys)
+        owned = []
+        waiting = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._get(key)
+                if cached is not None:
+                    results[i], latency = cached
+                    self.hits += 1
+                    self.saved_seconds += latency
+                elif key in self._in_flight:
+                    # Computed by another caller, or a duplicate key of this batch
+                    self.coalesced += 1
+                    waiting[i] = self._in_flight[key]
+                else:
+                    self.misses += 1
+                    self._in_flight[key] = Future()
+                    owned.append(i)
+
+        if owned:
+            futures = [self._in_flight[keys[i]] for i in owned]
+            try:
+                start = time.perf_counter()
+                computed = compute(owned)
+                if len(computed) != len(owned):
+                    raise ValueError(f"Expected {len(owned)} results, got {len(computed)}")
+                latency = (time.perf_counter() - start) / len(owned)
+                with self._lock:
+                    for i, result in zip(owned, computed):
+                        if result:
+                            self._set(keys[i], result, latency)
+                for i, future, result in zip(owned, futures, computed):
+                    results[i] = result
+                    future.set_result(result)
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for i in owned:
+                        self._in_flight.pop(keys[i], None)
+
+        for i, future in waiting.items():
+            results[i] = future.result()
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM glosses").fetchone()[0]
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_gloss_cache() -> GlossCache:
+    return GlossCache()
@@ -0,0 +1,105 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from spoken_to_signed.text_to_gloss.types import GlossItem
+
+# Vietnamese alphabet (and digits) as they appear in the lexicon, the vowel marks (breve, circumflex, horn)
+# are part of the letter while the five tones are signed separately, after the letters of the syllable
+LETTERS = frozenset("aăâbcdđeêghiklmnoôơpqrstuưvxy0123456789")
+TONES = {
+    "\u0301": "dấu sắc",
+    "\u0300": "dấu huyền",
+    "\u0309": "dấu hỏi",
+    "\u0303": "dấu ngã",
+    "\u0323": "dấu nặng",
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"[.!?:;]")
+
+# Part of the gloss cache keys of the glossers that spell locally, changes when the spelling rules do
+SPELLING_VERSION = 3
+
+
+@lru_cache(maxsize=4096)
+def spell(word: str) -> Tuple[GlossItem, ...]:
+    """Split a word into its letters and tone, e.g. "Thành" -> t, h, a, n, h, dấu huyền"""
+    letters = []
+    tones = []
+    for char in unicodedata.normalize("NFD", word.casefold()):
+        if char in TONES:
+            tones.append(TONES[char])
+        elif unicodedata.combining(char) and letters:
+            letters[-1] += char
+        else:
+            letters.append(char)
+
+    letters = [unicodedata.normalize("NFC", letter) for letter in letters]
+    return tuple((letter, letter) for letter in letters if letter in LETTERS) + tuple((tone, tone) for tone in tones)
+
+
+def is_spelled(token: str, sentence_start: bool = False) -> bool:
+    # Acronyms wherever they are ("UIT tuyển sinh"), and capitalized words that are not just starting a sentence
+    # ("Thành"): an unknown word at the start of a sentence is more likely an ordinary word, left to the glosser
+    # ("Chào bạn")
+    if len(token) > 1 and token.isupper():
+        return True
+    return not sentence_start and token[:1].isupper()
+
+
+def _tokens(text: str) -> Iterator[Tuple[re.Match, bool]]:
+    # Each token, and whether it starts a sentence
+    position = 0
+    sentence_start = True
+    for match in TOKEN_PATTERN.finditer(text):
+        sentence_start = sentence_start or SENTENCE_END.search(text, position, match.start()) is not None
+        yield match, sentence_start
+        position = match.end()
+        sentence_start = False
+
+
+def spelled_tokens(text: str, covered: Callable[[List[str]], List[bool]] = None) -> List[Tuple[re.Match, bool]]:
+    """
+    Each token of the (NFC) text, and whether it is fingerspelled. covered tells which of the casefolded tokens
+    are part of a lexicon entry, those are never spelled ("Việt Nam").
+    """
+    tokens = list(_tokens(text))
+    known = covered([match.group().casefold() for match, _ in tokens]) if covered is not None \
+        else [False] * len(tokens)
+    return [(match, not is_known and is_spelled(match.group(), sentence_start))
+            for (match, sentence_start), is_known in zip(tokens, known)]
+
+
+def split_spelled(text: str, covered: Callable[[List[str]], List[bool]] = None) -> Iterator[Tuple[bool, List[str]]]:
+    """Split the tokens of the text into runs of (is_spelled, tokens), keeping their order"""
+    text = unicodedata.normalize("NFC", text)
+    run = []
+    for match, spelled in spelled_tokens(text, covered):
+        if spelled:
+            if run:
+                yield False, run
+                run = []
+            yield True, [match.group()]
+        else:
+            run.append(match.group())
+    if run:
+        yield False, run
+
+
+def mask_spelled(text: str, covered: Callable[[List[str]], List[bool]] = None) -> Tuple[str, Dict[str, str]]:
+    """Replace spelled tokens with placeholders (#1, #2...), returns the masked text and the placeholders"""
+    text = unicodedata.normalize("NFC", text)
+    placeholders = {}
+    masked = []
+    position = 0
+    for match, spelled in spelled_tokens(text, covered):
+        if spelled:
+            placeholder = f"#{len(placeholders) + 1}"
+            placeholders[placeholder] = match.group()
+            masked.append(text[position:match.start()])
+            masked.append(placeholder)
+            position = match.end()
+    masked.append(text[position:])
+    return "".join(masked), placeholders
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Awaitable, Optional, TypeVar
+
+from spoken_to_signed.metrics import span
+
+if TYPE_CHECKING:
+    import httpx
+
+T = TypeVar("T")
+
+# Upstream answers worth another try, anything else (bad request, bad key...) fails right away
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiSettings:
+    # Any server speaking the generateContent REST API, e.g. a local fake one (benchmarks/fake_gemini.py)
+    endpoint = os.environ.get("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com")
+    api_key = os.environ.get("GEMINI_API_KEY", "YOUR_API_KEY")
+    model = "gemini-1.5-flash"
+    deadline = 30.0  # seconds for a whole call, retries included
+    attempt_timeout = 10.0  # seconds for one request
+    retries = 3
+    backoff = 0.5  # seconds, doubled after every attempt, with full jitter
+    max_backoff = 8.0
+    max_concurrency = 8  # requests in flight, over all threads
+
+
+class GeminiError(RuntimeError):
+    def __init__(self, message: str, transient: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+
+
+def _retry_after(response: "httpx.Response") -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class GeminiClient:
+    """
+    Async client for the Gemini generateContent API, shared by every caller:
+    one connection pool, a bounded number of requests in flight, and a deadline per call.
+    """
+
+    def __init__(self, endpoint: str = None, api_key: str = None, model: str = None, max_concurrency: int = None):
+        self.endpoint = (endpoint or GeminiSettings.endpoint).rstrip("/")
+        self.api_key = api_key or GeminiSettings.api_key
+        self.model = model or GeminiSettings.model
+        self.max_concurrency = max_concurrency or GeminiSettings.max_concurrency
+
+        # Both belong to the event loop that first uses them
+        self._http = None
+        self._semaphore = None
+
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0  # as counted by Gemini, over all requests
+
+    def _session(self):
+        if self._http is None:
+            # Imported with the first request, processes that never call the LLM (trie glosser) skip it
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                base_url=self.endpoint,
+                headers={"x-goog-api-key": self.api_key},
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http, self._semaphore
+
+    async def _request(self, prompt: str, max_output_tokens: int, temperature: float, timeout: float) -> str:
+        import httpx  # Loaded on first use, see _session
+
+        http, semaphore = self._session()
+
+        body = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": temperature, "maxOutputTokens": max_output_tokens},
+        }
+        async with semaphore:
+            self.requests += 1
+            self.in_flight += 1
+            try:
+                response = await http.post(f"/v1beta/models/{self.model}:generateContent", json=body,
+                                           timeout=timeout)
+            except httpx.TimeoutException as e:
+                self.timeouts += 1
+                raise GeminiError(f"Gemini request timed out after {timeout:.1f}s", transient=True) from e
+            except httpx.TransportError as e:
+                raise GeminiError(f"Gemini request failed: {e}", transient=True) from e
+            finally:
+                self.in_flight -= 1
+
+        if response.status_code != 200:
+            raise GeminiError(f"Gemini returned {response.status_code}: {response.text[:200]}",
+                              transient=response.status_code in TRANSIENT_STATUS,
+                              retry_after=_retry_after(response))
+
+        try:
+            result = response.json()
+            self.prompt_tokens += result.get("usageMetadata", {}).get("promptTokenCount", 0)
+            parts = result["candidates"][0]["content"]["parts"]
+            return "".join(part.get("text", "") for part in parts)
+        except (ValueError, KeyError, IndexError) as e:
+            raise GeminiError(f"Unexpected Gemini response: {response.text[:200]}") from e
+
+    async def generate(self, prompt: str, max_output_tokens: int, temperature: float = 0,
+                       deadline: float = None) -> str:
+        """Generated text for the prompt, retrying transient errors until the deadline (in seconds)"""
+        end = time.monotonic() + (deadline if deadline is not None else GeminiSettings.deadline)
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            try:
+                timeout = min(GeminiSettings.attempt_timeout, remaining)
+                # The semaphore wait counts against the deadline too
+                with span("llm_request", model=self.model, attempt=attempt):
+                    return await asyncio.wait_for(self._request(prompt, max_output_tokens, temperature, timeout),
+                                                  timeout=remaining)
+            except asyncio.TimeoutError as e:
+                self.timeouts += 1
+                error = GeminiError("Gemini call deadline exceeded", transient=True)
+                error.__cause__ = e
+            except GeminiError as e:
+                error = e
+
+            attempt += 1
+            delay = random.uniform(0, min(GeminiSettings.max_backoff, GeminiSettings.backoff * 2 ** (attempt - 1)))
+            if error.retry_after is not None:
+                delay = max(delay, error.retry_after)
+            if not error.transient or attempt > GeminiSettings.retries or time.monotonic() + delay >= end:
+                self.failures += 1
+                raise error
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def count_tokens(self, prompt: str) -> int:
+        """Tokens of a prompt for the model (countTokens, one attempt)"""
+        http, _ = self._session()
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        response = await http.post(f"/v1beta/models/{self.model}:countTokens", json=body,
+                                   timeout=GeminiSettings.attempt_timeout)
+        if response.status_code != 200:
+            raise GeminiError(f"Gemini returned {response.status_code}: {response.text[:200]}")
+        return response.json()["totalTokens"]
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "prompt_tokens": self.prompt_tokens,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    # Synchronous callers (worker threads) share one loop, so that they share the client and its limits
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coroutine: Awaitable[T]) -> T:
+    """Run a coroutine on the shared event loop, from a thread that is not running it"""
+    return asyncio.run_coroutine_threadsafe(coroutine, _event_loop()).result()
+
+
+@lru_cache(maxsize=1)
+def get_gemini_client() -> GeminiClient:
+    return GeminiClient()
@@ -1,19 +1,24 @@
+import asyncio
+import hashlib
 import json
-import os
-import re
+import logging
+import unicodedata
+from collections import defaultdict
 from functools import lru_cache
-from pathlib import Path
-from typing import List
-
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
 
+from spoken_to_signed.text_normalization import fold
+from spoken_to_signed.text_to_gloss.cache import get_gloss_cache, normalize_text
+from spoken_to_signed.text_to_gloss.gemini_client import GeminiSettings, get_gemini_client, run_sync
+from spoken_to_signed.text_to_gloss.fingerspelling import LETTERS, SPELLING_VERSION, TONES, mask_spelled, spell
+from spoken_to_signed.text_to_gloss.trie import SyllableTrie, segment_with_spelling, syllables
 from spoken_to_signed.text_to_gloss.types import Gloss, GlossItem
 
+logger = logging.getLogger(__name__)
 
 VOCAB_LIST = ["xin chào", "tạm biệt", "chó cắn", "anh ruột", "bạn yêu tôi", "chết", "chị", "cha", "chạy", "ăn uống", "ai", "bạn", "ai bảo", "xin lỗi", "yếu", "yêu cầu", "yêu mến", "xảy ra", "xe máy", "trường", "vô duyên", "tôi yêu bạn", "yên tâm", "thầy giáo", "việt nam", "tính toán", "là gì", "ngôn ngữ kí hiệu", "tên là gì", "trung quốc", "tên", "hối hận", "nhưng", "tẩy chay", "ô trống", "mẹ", "ở ngoài", "nấu nướng", "sức khỏe", "suy nghĩ", "nhầm lẫn", "nghiên cứu", "ghen", "kịp thời", "học tập", "em trai", "không có", "đồ ăn", "hằng ngày", "hoan hô", "khoa học", "giết", "có không", "em gái", "đúng không", "đi học", "chúng tôi", "dạy", "tôi", "7", "1", "3", "2", "4", "9", "8", "6", "5", "10", "dấu sắc", "dấu ngã", "dấu huyền", "dấu nặng", "dấu hỏi", "y", "ư", "v", "ă", "đ", "â", "ơ", "ê", "t", "ô", "x", "r", "e", "u", "o", "q", "h", "l", "m", "p", "s", "b", "n", "c", "g", "d", "i", "a", "k", "năng lực", "ôn luyện", "lớp học", "đánh giá", "đi dạo"]
 
-SYSTEM_PROMPT = f"""
+PROMPT_INSTRUCTIONS = """
 Bạn là trợ lý chuyển đổi văn bản tiếng Việt thành gloss cho ngôn ngữ ký hiệu Việt Nam.
 
 NHIỆM VỤ:
@@ -21,98 +26,192 @@ NHIỆM VỤ:
 - Chỉ trả về những từ/cụm từ có trong vocab list
 - Không tách nhỏ các cụm từ thành từng từ đơn lẻ
 - Giữ nguyên format "từ gốc" (không cần chuyển đổi gì)
-- XỬ LÝ TÊN RIÊNG VÀ TỪ VIẾT TẮT: Tách thành từng chữ cái riêng biệt
-
-DANH SÁCH TỪ VỰNG:
-{', '.join(VOCAB_LIST)}
-
-QUY TẮC ĐẶC BIỆT:
-1. TÊN RIÊNG (tên người): Tách thành từng chữ cái + dấu thanh riêng
-   - Ví dụ: "Thành" → "t", "h", "a", "n", "h", "dấu huyền"
-   - Ví dụ: "Hiển" → "h", "i", "ê", "n", "dấu hỏi"]
-   - Ví dụ: "Hà" → "h", "a", "dấu huyền"
-
-2. TỪ VIẾT TẮT (chữ in hoa): Tách thành từng chữ cái
-   - Ví dụ: "UIT" → "u", "i", "t"
-   - Ví dụ: "HCMUS" → "h", "c", "m", "u", "s"
+- Tên riêng và từ viết tắt đã được thay bằng ký hiệu #1, #2...: giữ nguyên các ký hiệu này, đúng vị trí
+""".strip()
 
+PROMPT_EXAMPLES = """
 VÍ DỤ THÔNG THƯỜNG:
 Input: "Thầy tôi đang ôn đánh giá năng lực cho lớp tôi"
 Output: ["thầy giáo", "tôi", "ôn luyện", "đánh giá", "năng lực", "lớp học", "tôi"]
 
-VÍ DỤ VỚI TÊN RIÊNG:
-Input: "Tôi tên là Thành"
-Output: ["tôi", "tên", "t", "h", "a", "n", "h", "dấu huyền"
-
-VÍ DỤ VỚI TỪ VIẾT TẮT:
-Input: "Tôi học ở UIT"
-Output: ["tôi", "học", "u", "i", "t"]
+VÍ DỤ VỚI TÊN RIÊNG VÀ TỪ VIẾT TẮT:
+Input: "Tôi tên là #1"
+Output: ["tôi", "tên", "#1"]
 
-Input: "bạn Hiển từ HCMUS"
-Output: "bạn", "h", "i", "ê", "n", "dấu hỏi", "h", "c", "m", "u", "s"
+Input: "bạn #1 từ #2"
+Output: ["bạn", "#1", "#2"]
 
 ĐỊNH DẠNG ĐẦU RA:
-CHỈ trả về JSON array các cụm từ có trong vocab hoặc array các chữ cái cho tên riêng/từ viết tắt, không có markdown:
+CHỈ trả về JSON array các cụm từ có trong vocab và các ký hiệu #1, #2..., không có markdown:
 """.strip()
 
+@lru_cache(maxsize=1024)
+def build_system_prompt(vocabulary: Tuple[str, ...]) -> str:
+    return f"{PROMPT_INSTRUCTIONS}\n\nDANH SÁCH TỪ VỰNG:\n{', '.join(vocabulary)}\n\n{PROMPT_EXAMPLES}"
+
+SYSTEM_PROMPT = build_system_prompt(tuple(VOCAB_LIST))
+
+# Only the vocabulary entries that share a syllable with the input (and the alphabet) are sent to the model,
+# the prompt no longer grows with the whole vocabulary
+PRUNE_VOCABULARY = True
+# Letters, digits and tones, for the words the model spells (some letters are decomposed in the list)
+ALPHABET = [word for word in VOCAB_LIST
+            if unicodedata.normalize("NFC", word) in LETTERS or word in TONES.values()]
+
+MODEL_NAME = GeminiSettings.model
+# Sentences per request in text_to_gloss_batch
+BATCH_SIZE = 20
+
+# Cached glosses are only valid for the prompt (and vocabulary), the spelled words and model that produced them
+PROMPT_VERSION = hashlib.sha256(f"{MODEL_NAME}\n{PRUNE_VOCABULARY}\n{SPELLING_VERSION}\n{SYSTEM_PROMPT}"
+                                .encode("utf-8")).hexdigest()[:16]
+
 @lru_cache(maxsize=1)
-def get_gemini_client():
-    api_key = "YOUR_API_KEY"
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel('gemini-1.5-flash')
+def get_vocab_trie() -> SyllableTrie:
+    trie = SyllableTrie()
+    for vocab_word in VOCAB_LIST:
+        trie.add(vocab_word, (vocab_word, vocab_word))
+    return trie
+
+@lru_cache(maxsize=1)
+def get_vocab_syllable_index() -> Dict[str, List[str]]:
+    """Folded syllable (without diacritics) -> vocabulary entries that have it"""
+    index = defaultdict(list)
+    for vocab_word in VOCAB_LIST:
+        for syllable in dict.fromkeys(fold(syllable) for syllable in syllables(vocab_word)):
+            index[syllable].append(vocab_word)
+    return index
+
+def prompt_vocabulary(texts: List[str]) -> Tuple[str, ...]:
+    """Vocabulary entries plausibly in the texts, in VOCAB_LIST order"""
+    if not PRUNE_VOCABULARY:
+        return tuple(VOCAB_LIST)
+    index = get_vocab_syllable_index()
+    candidates = set(ALPHABET)
+    for text in texts:
+        for syllable in syllables(text):
+            candidates.update(index.get(fold(syllable), ()))
+    return tuple(word for word in VOCAB_LIST if word in candidates)
+
+def build_prompt(masked_text: str) -> str:
+    return f"""
+{build_system_prompt(prompt_vocabulary([masked_text]))}
+
+Tìm các từ/cụm từ trong câu sau có trong vocab list:
+"{masked_text}"
+
+Chỉ trả về JSON array:
+"""
+
+def build_batch_prompt(masked_texts: List[str]) -> str:
+    numbered = "\n".join(f'{i + 1}. "{masked_text}"' for i, masked_text in enumerate(masked_texts))
+    return f"""
+{build_system_prompt(prompt_vocabulary(masked_texts))}
+
+Với từng câu sau (mỗi câu có ký hiệu #1, #2... riêng), tìm các từ/cụm từ có trong vocab list:
+{numbered}
+
+Chỉ trả về một JSON array gồm đúng {len(masked_texts)} JSON array, theo thứ tự các câu:
+"""
+
+def unmask_spelled(sentence: str, placeholders: dict) -> List[str]:
+    token = sentence.strip()
+    if token in placeholders:
+        return [letter for letter, _ in spell(placeholders[token])]
+    return [sentence]
 
 def sentence_to_glosses(sentence: str) -> GlossItem:
  
     yield sentence.strip(), sentence.strip()
 
+def _cache_key(text: str, language: str, signed_language: str) -> str:
+    return f"gpt:{PROMPT_VERSION}:{language}:{signed_language}:{normalize_text(text)}"
+
+def cached_text_to_gloss(text: str, language: str, signed_language: str, **kwargs) -> Optional[List[Gloss]]:
+    """text_to_gloss if it is cached, None instead of calling the model"""
+    return get_gloss_cache().get(_cache_key(text, language, signed_language))
+
 def text_to_gloss(text: str, language: str, signed_language: str, **kwargs) -> List[Gloss]:
+    key = _cache_key(text, language, signed_language)
+    return get_gloss_cache().get_or_compute(key, lambda: run_sync(_llm_text_to_gloss(text, language, signed_language)))
+
+def text_to_gloss_batch(texts: List[str], language: str, signed_language: str, **kwargs) -> List[List[Gloss]]:
+    """
+    text_to_gloss for many texts, the ones that are not cached are sent BATCH_SIZE at a time in one request,
+    with the requests running concurrently (up to the client's limit)
+    """
+    keys = [_cache_key(text, language, signed_language) for text in texts]
+
+    async def gloss_all(batches: List[List[str]]) -> List[List[Gloss]]:
+        results = await asyncio.gather(*(_llm_text_to_gloss_batch(batch, language, signed_language)
+                                          for batch in batches))
+        return [glosses for batch in results for glosses in batch]
+
+    def compute(indexes: List[int]) -> List[List[Gloss]]:
+        batches = [[texts[i] for i in indexes[start:start + BATCH_SIZE]]
+                   for start in range(0, len(indexes), BATCH_SIZE)]
+        return run_sync(gloss_all(batches))
+
+    return get_gloss_cache().get_or_compute_many(keys, compute)
+
+async def _generate(prompt: str, max_output_tokens: int) -> str:
+    # Upstream errors (after retries) are raised, so that callers report them instead of signing nothing
+    prediction = (await get_gemini_client().generate(prompt, max_output_tokens=max_output_tokens)).strip()
+    logger.debug("Gemini response: %s", prediction)
+
+    # Clean up markdown
+    return prediction.replace('```json', '').replace('```', '').strip()
+
+def _vocab_words_to_glosses(words: List[str], placeholders: dict) -> List[Gloss]:
+    words = [item for word in words for item in unmask_spelled(word, placeholders)]
+    logger.debug("Found vocab words: %s", words)
+
+    result = [list(sentence_to_glosses(word)) for word in words]
+    logger.debug("Generated glosses: %s", result)
+    return result
+
+async def _llm_text_to_gloss(text: str, language: str, signed_language: str) -> List[Gloss]:
+    # Proper names and acronyms are fingerspelled locally, the model only sees placeholders for them
+    masked_text, placeholders = mask_spelled(text, get_vocab_trie().covered)
+
+    prediction = await _generate(build_prompt(masked_text), max_output_tokens=200)
+
     try:
-        full_prompt = f"""
-{SYSTEM_PROMPT}
+        sentences = json.loads(prediction)
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        if not isinstance(sentences, list) or not all(isinstance(word, str) for word in sentences):
+            raise ValueError("Expected a JSON array of strings")
+    except ValueError:
+        logger.warning("Failed to parse JSON: %s", prediction)
 
-Tìm các từ/cụm từ trong câu sau có trong vocab list:
-"{text}"
+        # Longest vocabulary matches, in sentence order
+        matches, _ = segment_with_spelling(text, get_vocab_trie())
+        sentences = [vocab_word for vocab_word, _ in matches]
 
-Chỉ trả về JSON array:
-"""
+    return _vocab_words_to_glosses(sentences, placeholders)
+
+async def _llm_text_to_gloss_batch(texts: List[str], language: str, signed_language: str) -> List[List[Gloss]]:
+    if len(texts) == 1:
+        return [await _llm_text_to_gloss(texts[0], language, signed_language)]
 
-        model = get_gemini_client()
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0,
-                max_output_tokens=200,
-            )
-        )
-
-        prediction = response.text.strip()
-        print(f"Gemini response: {prediction}")
-        
-        # Clean up markdown
-        prediction = prediction.replace('```json', '').replace('```', '').strip()
-        
-        try:
-            sentences = json.loads(prediction)
-            if isinstance(sentences, str):
-                sentences = [sentences]
-        except json.JSONDecodeError:
-            print(f"Failed to parse JSON: {prediction}")
-            
-            sentences = []
-            for vocab_word in VOCAB_LIST:
-                if vocab_word.lower() in text.lower():
-                    sentences.append(vocab_word)
-        
-        print(f"Found vocab words: {sentences}")
-        
-        
-        result = [list(sentence_to_glosses(sentence)) for sentence in sentences]
-        print(f"Generated glosses: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"Error in text_to_gloss: {str(e)}")
-        return []
+    masked = [mask_spelled(text, get_vocab_trie().covered) for text in texts]
+
+    prompt = build_batch_prompt([masked_text for masked_text, _ in masked])
+    prediction = await _generate(prompt, max_output_tokens=200 * len(texts))
+    try:
+        predictions = json.loads(prediction)
+        if not isinstance(predictions, list) or len(predictions) != len(texts) \
+                or not all(isinstance(words, list) and all(isinstance(word, str) for word in words)
+                           for words in predictions):
+            raise ValueError(f"Expected {len(texts)} arrays of strings")
+    except ValueError as e:
+        # One request per sentence instead
+        logger.warning("Error in text_to_gloss_batch: %s", e)
+        return list(await asyncio.gather(*(_llm_text_to_gloss(text, language, signed_language) for text in texts)))
+
+    return [_vocab_words_to_glosses(words, placeholders)
+            for words, (_, placeholders) in zip(predictions, masked)]
 
 if __name__ == '__main__':
     text = "Thầy tôi đang ôn đánh giá năng lực cho lớp tôi"
@@ -0,0 +1,168 @@
+import csv
+import importlib
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from spoken_to_signed.gloss_to_pose.lookup.lexicon_index import get_lexicon_index, lexicon_index_path
+from spoken_to_signed.text_to_gloss.fingerspelling import spell, split_spelled
+from spoken_to_signed.text_to_gloss.types import Gloss, GlossItem
+
+DEFAULT_LEXICON = str(Path(__file__).parent.parent.parent / "assets" / "vietnamese_lexicon")
+
+SYLLABLE_PATTERN = re.compile(r"\w+")
+END = ""  # Never a syllable, marks the end of a lexicon entry in the trie
+
+
+def syllables(text: str) -> List[str]:
+    # NFC so that decomposed input ("a" + combining grave) matches the lexicon ("à")
+    return SYLLABLE_PATTERN.findall(unicodedata.normalize("NFC", text).casefold())
+
+
+class SyllableTrie:
+    def __init__(self):
+        self.root = {}
+
+    def add(self, phrase: str, item: GlossItem):
+        node = self.root
+        for syllable in syllables(phrase):
+            node = node.setdefault(syllable, {})
+        # The first entry added for a phrase (the best priority) wins
+        node.setdefault(END, item)
+
+    def segment(self, text: str) -> Tuple[List[GlossItem], List[str]]:
+        """Greedy longest match over the syllables of the text, returns the matches and the unmatched syllables"""
+        return self.segment_syllables(syllables(text))
+
+    def spans(self, tokens: List[str]) -> Iterator[Tuple[int, int, Optional[GlossItem]]]:
+        """Greedy longest match over the tokens: (start, end, item) in order, item is None for an unmatched token"""
+        i = 0
+        while i < len(tokens):
+            node = self.root
+            match = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if END in node:
+                    match = (j, node[END])
+
+            if match is None:
+                yield i, i + 1, None
+                i += 1
+            else:
+                yield i, match[0], match[1]
+                i = match[0]
+
+    def covered(self, tokens: List[str]) -> List[bool]:
+        """Whether each token is part of a lexicon entry in the segmentation"""
+        covered = [False] * len(tokens)
+        for start, end, item in self.spans(tokens):
+            if item is not None:
+                covered[start:end] = [True] * (end - start)
+        return covered
+
+    def segment_syllables(self, tokens: List[str]) -> Tuple[List[GlossItem], List[str]]:
+        matches = []
+        unmatched = []
+        for start, _, item in self.spans(tokens):
+            if item is None:
+                unmatched.append(tokens[start])
+            else:
+                matches.append(item)
+        return matches, unmatched
+
+
+def segment_with_spelling(text: str, trie: SyllableTrie) -> Tuple[List[GlossItem], List[str]]:
+    # Lexicon entries first, then the proper names and acronyms left are fingerspelled. Spelled tokens are never
+    # part of an entry, so segmenting the runs between them gives the same matches as the whole text
+    matches = []
+    unmatched = []
+    for spelled, tokens in split_spelled(text, trie.covered):
+        if spelled:
+            matches.extend(spell(tokens[0]))
+        else:
+            run_matches, run_unmatched = trie.segment_syllables([token.casefold() for token in tokens])
+            matches.extend(run_matches)
+            unmatched.extend(run_unmatched)
+    return matches, unmatched
+
+
+def as_sentences(matches: List[GlossItem]) -> List[Gloss]:
+    # One sentence per sign, like the gpt glosser: the same text gives the same video (and output cache key)
+    # whichever glosser handled it
+    return [[item] for item in matches]
+
+
+@lru_cache(maxsize=None)
+def get_lexicon_trie(lexicon: str, spoken_language: str, signed_language: str) -> SyllableTrie:
+    index_path = lexicon_index_path(lexicon)
+    if index_path is not None:
+        # Already in priority order
+        rows = get_lexicon_index(index_path).entries(spoken_language, signed_language)
+    else:
+        with open(os.path.join(lexicon, 'index.csv'), mode='r', encoding='utf-8') as f:
+            rows = [row for row in csv.DictReader(f)
+                    if row['spoken_language'] == spoken_language and row['signed_language'] == signed_language]
+        rows = sorted(rows, key=lambda r: int(r['priority']))
+
+    trie = SyllableTrie()
+    for row in rows:
+        trie.add(row['words'], (row['words'], row['glosses']))
+    return trie
+
+
+def text_to_gloss(text: str, language: str, signed_language: str, lexicon: str = DEFAULT_LEXICON,
+                  fallback_glosser: str = None, **kwargs) -> List[Gloss]:
+    trie = get_lexicon_trie(os.path.realpath(lexicon), language, signed_language)
+    matches, unmatched = segment_with_spelling(text, trie)
+
+    # Only sentences that do not segment fully need the (slow, remote) fallback glosser
+    if unmatched and fallback_glosser is not None:
+        module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{fallback_glosser}")
+        return module.text_to_gloss(text=text, language=language, signed_language=signed_language, **kwargs)
+
+    return as_sentences(matches)
+
+
+def cached_text_to_gloss(text: str, language: str, signed_language: str, lexicon: str = DEFAULT_LEXICON,
+                         fallback_glosser: str = None, **kwargs) -> Optional[List[Gloss]]:
+    """text_to_gloss without a remote call: None when the fallback glosser is needed and has nothing cached"""
+    trie = get_lexicon_trie(os.path.realpath(lexicon), language, signed_language)
+    matches, unmatched = segment_with_spelling(text, trie)
+    if unmatched and fallback_glosser is not None:
+        module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{fallback_glosser}")
+        if not hasattr(module, "cached_text_to_gloss"):
+            return None
+        return module.cached_text_to_gloss(text=text, language=language, signed_language=signed_language, **kwargs)
+    return as_sentences(matches)
+
+
+def text_to_gloss_batch(texts: List[str], language: str, signed_language: str, lexicon: str = DEFAULT_LEXICON,
+                        fallback_glosser: str = None, **kwargs) -> List[List[Gloss]]:
+    trie = get_lexicon_trie(os.path.realpath(lexicon), language, signed_language)
+    results = []
+    fallback_indexes = []
+    for i, text in enumerate(texts):
+        matches, unmatched = segment_with_spelling(text, trie)
+        if unmatched and fallback_glosser is not None:
+            fallback_indexes.append(i)
+        results.append(as_sentences(matches))
+
+    # The sentences that need the fallback glosser are sent together, when it supports batches
+    if fallback_indexes:
+        module = importlib.import_module(f"spoken_to_signed.text_to_gloss.{fallback_glosser}")
+        fallback_texts = [texts[i] for i in fallback_indexes]
+        if hasattr(module, "text_to_gloss_batch"):
+            glossed = module.text_to_gloss_batch(texts=fallback_texts, language=language,
+                                                 signed_language=signed_language, **kwargs)
+        else:
+            glossed = [module.text_to_gloss(text=text, language=language, signed_language=signed_language, **kwargs)
+                       for text in fallback_texts]
+        for i, result in zip(fallback_indexes, glossed):
+            results[i] = result
+
+    return results